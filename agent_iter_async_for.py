@@ -1,10 +1,7 @@
-import asyncio
-
-import nest_asyncio
 from pydantic_ai import Agent, RunContext
 from pydantic_graph import End
 
-nest_asyncio.apply()  # for notebook
+from pydantic_ai_examples.loop_thread import run_coroutine
 
 
 agent = Agent("google-gla:gemini-1.5-flash")
@@ -23,7 +20,7 @@ async def main():
     print(agent_run.result.output)
 
 
-asyncio.run(main())
+run_coroutine(main())
 
 
 # using .next() manually
@@ -39,4 +36,4 @@ async def move_node_manually():
         print(all_nodes)
 
 
-asyncio.run(move_node_manually())
+run_coroutine(move_node_manually())
@@ -1,11 +1,13 @@
 # Building support agent for a bank
 # import logfire
-import nest_asyncio
 from dataclasses import dataclass
 from pydantic import BaseModel, Field
 from pydantic_ai import Agent, RunContext
 
-nest_asyncio.apply()
+from pydantic_ai_examples.batch import run_batch
+from pydantic_ai_examples.loop_thread import run_coroutine
+from pydantic_ai_examples.response_cache import with_response_cache
+from pydantic_ai_examples.tools import memoize
 
 # logfire.configure()
 # logfire.instrument_asyncpg()
@@ -51,7 +53,8 @@ class SupportOutput(BaseModel):
 
 
 support_agent = Agent(
-    "google-gla:gemini-1.5-flash",
+    # set RESPONSE_CACHE_PATH to answer repeated queries from a local cache
+    with_response_cache("google-gla:gemini-1.5-flash"),
     deps_type=SupportDependencies,
     output_type=SupportOutput,
     system_prompt=(
@@ -85,7 +88,9 @@ async def add_customer_name(ctx: RunContext[SupportDependencies]) -> str:
     return f"The customer's name is {customer_name}"
 
 
+# the balance is asked for again on retries and follow-up queries
 @support_agent.tool
+@memoize(ttl=30, deps_key=lambda deps: deps.customer_id)
 async def customer_balance(
     ctx: RunContext[SupportDependencies], include_pending: bool
 ) -> float:
@@ -99,11 +104,10 @@ async def customer_balance(
 
 if __name__ == "__main__":
     deps = SupportDependencies(customer_id=123, db=DatabaseConn())
-    result = support_agent.run_sync("What is my balance?", deps=deps)
-    print(result.output)
-
-    result = support_agent.run_sync("I just lost my card", deps=deps)
-    print(result.output)
-
-    result = support_agent.run_sync("I want to block my card", deps=deps)
-    print(result.output)
+    queries = ["What is my balance?", "I just lost my card", "I want to block my card"]
+    # the queries are independent, so run them concurrently
+    results = run_coroutine(
+        run_batch(support_agent, [(query, deps) for query in queries])
+    )
+    for result in results:
+        print(result.output)
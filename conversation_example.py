@@ -1,16 +1,17 @@
-import nest_asyncio
 from pydantic_ai import Agent
 
-nest_asyncio.apply()
+from pydantic_ai_examples.history import CompactingHistory
+from pydantic_ai_examples.loop_thread import run_coroutine
 
 agent = Agent("google-gla:gemini-1.5-flash")
+# keeps the recent turns verbatim and summarizes older ones,
+# so long conversations don't resend the whole transcript every turn
+history = CompactingHistory("google-gla:gemini-1.5-flash")
 
 # First run
-result1 = agent.run_sync("Who was Albert Einstein?")
+result1 = run_coroutine(history.run(agent, "Who was Albert Einstein?"))
 print(result1.output)
 
-# Second run
-result2 = agent.run_sync(
-    "What was his most famous equation?", message_history=result1.new_messages()
-)
+# Second run, with the history of the first
+result2 = run_coroutine(history.run(agent, "What was his most famous equation?"))
 print(result2.output)
@@ -1,3 +1,7 @@
+# Uses the pydantic_ai_examples package, so run it from the repository root with:
+#
+#     PYTHONPATH=. python "function tools/customize_name.py"
+
 from __future__ import annotations
 
 from typing import Literal
@@ -7,6 +11,8 @@ from pydantic_ai import Agent, RunContext
 from pydantic_ai.models.test import TestModel
 from pydantic_ai.tools import Tool, ToolDefinition
 
+from pydantic_ai_examples.tools import cached_prepare
+
 nest_asyncio.apply()
 
 
@@ -14,6 +20,9 @@ def greet(name: str) -> str:
     return f"Hello {name}"
 
 
+# prepare runs before every model request, the description only depends on the deps.
+# It's given a copy of the schema, which is shared by every run, to change in place
+@cached_prepare(fingerprint=lambda deps: deps)
 async def prepare_greet(
     context: RunContext[Literal["human", "machine"]],
     tool_def: ToolDefinition,
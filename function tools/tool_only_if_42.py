@@ -1,13 +1,21 @@
+# Uses the pydantic_ai_examples package, so run it from the repository root with:
+#
+#     PYTHONPATH=. python "function tools/tool_only_if_42.py"
+
 import nest_asyncio
 from typing import Union
 from pydantic_ai import Agent, RunContext
 from pydantic_ai.tools import ToolDefinition
 
+from pydantic_ai_examples.tools import cached_prepare
+
 nest_asyncio.apply()
 
 agent = Agent("test")
 
 
+# the answer only depends on the deps, so it's worked out once per deps value
+@cached_prepare(fingerprint=lambda deps: deps)
 async def only_if_42(
     context: RunContext,
     tool_def: ToolDefinition,
@@ -1,3 +1,4 @@
+import mmap
 from pathlib import Path
 from typing import List, Optional
 
@@ -37,10 +38,16 @@ agent = Agent(model=OpenAIResponsesModel("gpt-4.1-nano"))
 
 pdf_path = Path("cre.pdf")
 
+# map the PDF rather than reading it, its pages stay in the OS page cache instead
+# of being copied into a bytes object held for the whole run. pydantic can't
+# serialize a memoryview, so copy it with bytes(pdf_data) before storing the messages
+with pdf_path.open("rb") as f:
+    pdf_data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
 result = agent.run_sync(
     [
         "Extract questions from this document?",
-        BinaryContent(data=pdf_path.read_bytes(), media_type="application/pdf"),
+        BinaryContent(data=pdf_data, media_type="application/pdf"),
     ],
     output_type=Questions,
 )
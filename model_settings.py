@@ -1,12 +1,11 @@
-import nest_asyncio
 from pydantic_ai import Agent, UnexpectedModelBehavior
 from pydantic_ai.models.gemini import GeminiModelSettings
 
-nest_asyncio.apply()
+from pydantic_ai_examples.loop_thread import run_sync
 
 agent = Agent("openai:gpt-4.1-mini")
-result_sync = agent.run_sync(
-    "what is the capital of Kenya?", model_settings={"temperature": 0.0}
+result_sync = run_sync(
+    agent, "what is the capital of Kenya?", model_settings={"temperature": 0.0}
 )
 print(result_sync.output)
 
@@ -18,7 +17,8 @@ agent = Agent(
     system_prompt="You are a helpful assistant that can answer questions about the world.",
 )
 try:
-    result = agent.run_sync(
+    result = run_sync(
+        agent,
         "Write a list of 5 very rude things that I might say to the universe after stubbing my toe in the dark:",
         model_settings=GeminiModelSettings(
             temperature=0.0,
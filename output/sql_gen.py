@@ -1,3 +1,8 @@
+# Uses the pydantic_ai_examples package, so run it from the repository root with:
+#
+#     python -m output.sql_gen
+
+from collections import OrderedDict
 from typing import Union
 
 from fake_database import DatabaseConn, QueryError
@@ -5,6 +10,11 @@ from pydantic import BaseModel
 
 from pydantic_ai import Agent, RunContext, ModelRetry
 
+from pydantic_ai_examples.sql_check import SchemaCatalogue, describe, precheck_sql
+
+# results of `EXPLAIN` kept, identical queries aren't sent to the database again
+EXPLAIN_CACHE_SIZE = 1024
+
 
 class Success(BaseModel):
     sql_query: str
@@ -21,18 +31,50 @@ agent: Agent[DatabaseConn, Output] = Agent(
     deps_type=DatabaseConn,
     system_prompt="Generate PostgreSQL flavored SQL queries based on user input.",
 )
+# tables and columns, read from the database once
+catalogue = SchemaCatalogue()
 
 
-@agent.output_validator
-async def validate_sql(ctx: RunContext[DatabaseConn], output: Output) -> Output:
-    if isinstance(output, InvalidRequest):
-        return output
+@agent.system_prompt
+async def database_schema(ctx: RunContext[DatabaseConn]) -> str:
+    tables = await catalogue.get(ctx.deps)
+    return f"The database's tables are:\n{describe(tables)}" if tables else ""
+
+
+_explained: OrderedDict[str, str | None] = OrderedDict()
+
+
+async def explain(db: DatabaseConn, query: str) -> str | None:
+    """`EXPLAIN` `query`, returning the database's error if it's invalid.
+
+    Results are memoized, queries differing only in whitespace share one.
+    """
+    key = " ".join(query.split())
+    if key in _explained:
+        _explained.move_to_end(key)
+        return _explained[key]
     try:
-        await ctx.deps.execute(f"EXPLAIN {output.sql_query}")
+        await db.execute(f"EXPLAIN {query}")
     except QueryError as e:
-        raise ModelRetry(f"Invalid query: {e}") from e
+        error = str(e)
     else:
+        error = None
+    _explained[key] = error
+    if len(_explained) > EXPLAIN_CACHE_SIZE:
+        _explained.popitem(last=False)
+    return error
+
+
+@agent.output_validator
+async def validate_sql(ctx: RunContext[DatabaseConn], output: Output) -> Output:
+    if isinstance(output, InvalidRequest):
         return output
+    # reject obvious mistakes before a round trip to the database
+    if error := precheck_sql(output.sql_query, await catalogue.get(ctx.deps)):
+        raise ModelRetry(f"Invalid query: {error}")
+    if error := await explain(ctx.deps, output.sql_query):
+        raise ModelRetry(f"Invalid query: {error}")
+    return output
 
 
 result = agent.run_sync(
@@ -0,0 +1,222 @@
+"""Run an agent over many inputs concurrently, within the provider's rate limits.
+
+Runs are admitted by a `BatchScheduler` holding token buckets for requests and
+tokens per minute. A run's tokens are estimated up front and the bucket is settled
+against the real usage once it finishes. When the provider still answers with a
+429, admission pauses for its `retry-after` and the run is retried.
+
+Benchmark against a local fake provider with:
+
+    uv run -m pydantic_ai_examples.fake_chat
+"""
+
+from __future__ import annotations as _annotations
+
+import asyncio
+import random
+import time
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+import logfire
+from pydantic_ai import Agent
+from pydantic_ai.agent import AgentRunResult
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.usage import Usage
+
+from .embeddings import estimate_tokens, retry_after
+
+DepsT = TypeVar("DepsT")
+OutputT = TypeVar("OutputT")
+
+MAX_CONCURRENT_RUNS = 16
+# output tokens reserved per run, before its real usage is known
+EXPECTED_OUTPUT_TOKENS = 256
+
+
+class TokenBucket:
+    """Refills at `per_minute` units a minute, up to `capacity`.
+
+    Callers are served first come, first served, so a large request isn't starved by
+    a stream of small ones.
+    """
+
+    def __init__(self, per_minute: float, capacity: float | None = None):
+        self.rate = per_minute / 60
+        self.capacity = capacity or per_minute
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float) -> None:
+        # more than the capacity could never be granted
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.available < amount:
+                await asyncio.sleep((amount - self.available) / self.rate)
+                self._refill()
+            self.available -= amount
+
+    def charge(self, amount: float) -> None:
+        """Adjust the bucket by `amount` after the fact, it may go into debt."""
+        self._refill()
+        self.available -= amount
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(
+            self.available + (now - self.updated) * self.rate, self.capacity
+        )
+        self.updated = now
+
+
+@dataclass
+class BatchScheduler:
+    """Admits runs within requests and tokens per minute, pausing on 429s.
+
+    Args:
+        requests_per_minute: Requests per minute allowed by the provider
+        tokens_per_minute: Tokens per minute allowed by the provider
+        burst_seconds: Seconds' worth of each limit which may be used at once.
+            Providers enforce their limits over windows shorter than a minute, by
+            default runs are paced evenly rather than sent in bursts
+    """
+
+    requests_per_minute: float | None = None
+    tokens_per_minute: float | None = None
+    burst_seconds: float = 0.0
+
+    def __post_init__(self):
+        self.requests = self._bucket(self.requests_per_minute)
+        self.tokens = self._bucket(self.tokens_per_minute)
+        self.paused_until = 0.0
+        self.throttled = 0
+
+    async def admit(self, tokens: int) -> None:
+        while (delay := self.paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+        if self.requests:
+            await self.requests.acquire(1)
+        if self.tokens:
+            await self.tokens.acquire(tokens)
+
+    def settle(self, estimated_tokens: int, usage: Usage) -> None:
+        """Charge the difference between the estimate and what the run really used."""
+        if self.requests and usage.requests > 1:
+            # tool calls make more than the one request admitted for
+            self.requests.charge(usage.requests - 1)
+        if self.tokens and usage.total_tokens is not None:
+            self.tokens.charge(usage.total_tokens - estimated_tokens)
+
+    def _bucket(self, per_minute: float | None) -> TokenBucket | None:
+        if not per_minute:
+            return None
+        return TokenBucket(per_minute, max(per_minute * self.burst_seconds / 60, 1))
+
+    def pause(self, seconds: float) -> None:
+        self.throttled += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+async def iter_batch(
+    agent: Agent[DepsT, OutputT],
+    inputs: Sequence[tuple[str, DepsT]],
+    scheduler: BatchScheduler | None = None,
+    max_concurrency: int = MAX_CONCURRENT_RUNS,
+    max_retries: int = 5,
+    return_exceptions: bool = False,
+    **run_kwargs: Any,
+) -> AsyncIterator[tuple[int, AgentRunResult[OutputT] | Exception]]:
+    """Run `agent` on each `(prompt, deps)` in `inputs`, yielding results as they complete.
+
+    Args:
+        agent: Agent to run
+        inputs: Prompt and dependencies for each run
+        scheduler: Rate limits to admit runs within, unlimited by default
+        max_concurrency: Maximum number of runs in flight
+        max_retries: Times a run is retried after a 429
+        return_exceptions: Yield a failed run's exception instead of raising it
+        run_kwargs: Passed on to `agent.run`
+
+    Yields:
+        tuple[int, AgentRunResult | Exception]: Index of the input and its result
+    """
+    scheduler = scheduler or BatchScheduler()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(index: int, prompt: str, deps: DepsT):
+        async with semaphore:
+            try:
+                return index, await _run_with_retries(
+                    agent, prompt, deps, scheduler, max_retries, run_kwargs
+                )
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                return index, e
+
+    tasks = [
+        asyncio.create_task(run(index, prompt, deps))
+        for index, (prompt, deps) in enumerate(inputs)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def run_batch(
+    agent: Agent[DepsT, OutputT],
+    inputs: Sequence[tuple[str, DepsT]],
+    scheduler: BatchScheduler | None = None,
+    max_concurrency: int = MAX_CONCURRENT_RUNS,
+    max_retries: int = 5,
+    return_exceptions: bool = False,
+    **run_kwargs: Any,
+) -> list[AgentRunResult[OutputT] | Exception]:
+    """Like `iter_batch`, but returns the results in the order of `inputs`."""
+    results: list[Any] = [None] * len(inputs)
+    async for index, result in iter_batch(
+        agent,
+        inputs,
+        scheduler,
+        max_concurrency,
+        max_retries,
+        return_exceptions,
+        **run_kwargs,
+    ):
+        results[index] = result
+    return results
+
+
+async def _run_with_retries(
+    agent: Agent[DepsT, OutputT],
+    prompt: str,
+    deps: DepsT,
+    scheduler: BatchScheduler,
+    max_retries: int,
+    run_kwargs: dict[str, Any],
+) -> AgentRunResult[OutputT]:
+    estimated_tokens = estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS
+    attempt = 0
+    while True:
+        await scheduler.admit(estimated_tokens)
+        try:
+            result = await agent.run(prompt, deps=deps, **run_kwargs)
+        except ModelHTTPError as e:
+            if e.status_code != 429 or attempt == max_retries:
+                raise
+            # the provider's headers are on the underlying client error
+            delay = retry_after(e.__cause__) or min(2**attempt, 30) * random.uniform(
+                0.5, 1.0
+            )
+            logfire.info("Run throttled, pausing for {delay:.2f}s", delay=delay)
+            scheduler.pause(delay)
+            attempt += 1
+        else:
+            scheduler.settle(estimated_tokens, result.usage())
+            return result
@@ -0,0 +1,234 @@
+"""Content-addressed cache of embeddings, shared by the RAG and question examples.
+
+Embeddings are keyed by the model and the normalized text. Lookups go through an
+in-process LRU first, then a memory-mapped file of float32 vectors on disk whose
+index lives in SQLite, so several worker processes can share one cache directory.
+"""
+
+from __future__ import annotations as _annotations
+
+import hashlib
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import logfire
+
+from .embeddings import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+DIGEST_SIZE = 32  # sha256
+FLOAT_SIZE = 4
+
+
+def normalize(text: str) -> str:
+    """Normalize text so trivially different queries share a cache entry."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\0{normalize(text)}".encode()).digest()
+
+
+class EmbeddingCache:
+    """Two-tier embedding cache: in-memory LRU in front of an on-disk store.
+
+    The on-disk store is a fixed number of slots in `vectors.f32`, each holding the
+    key digest followed by the vector. `index.sqlite` maps keys to slots and records
+    when each was last used; once every slot is taken, the least recently used entry
+    is evicted. SQLite's locking serializes writers across processes, and readers
+    re-check the digest stored in the slot so they never return a vector which was
+    evicted and overwritten under them.
+
+    Args:
+        path: Directory holding the cache files, created if missing
+        dimensions: Length of the cached vectors
+        max_bytes: Size of the on-disk vector file, this bounds the number of entries
+        memory_entries: Number of vectors kept in the in-memory LRU
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        dimensions: int = EMBEDDING_DIMENSIONS,
+        max_bytes: int = 256 * 1024 * 1024,
+        memory_entries: int = 4096,
+    ):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.dimensions = dimensions
+        self.slot_size = DIGEST_SIZE + dimensions * FLOAT_SIZE
+        self.capacity = max_bytes // self.slot_size
+        if self.capacity < 1:
+            raise ValueError(f"max_bytes={max_bytes} can't hold a single embedding")
+        self.memory_entries = memory_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._memory: OrderedDict[bytes, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self.path / "index.sqlite",
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key BLOB PRIMARY KEY, slot INTEGER NOT NULL UNIQUE, last_used REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)"
+        )
+        # the cache may have been created with a larger max_bytes
+        self._db.execute("DELETE FROM entries WHERE slot >= ?", (self.capacity,))
+
+        size = self.capacity * self.slot_size
+        fd = os.open(self.path / "vectors.f32", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    def get(self, model: str, text: str) -> list[float] | None:
+        key = cache_key(model, text)
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return embedding
+
+            row = self._db.execute(
+                "SELECT slot FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            embedding = row and self._read_slot(row[0], key)
+            if not embedding:
+                self.misses += 1
+                return None
+            self._db.execute(
+                "UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self._remember(key, embedding)
+            self.hits += 1
+            return embedding
+
+    def put(self, model: str, text: str, embedding: list[float]) -> None:
+        if len(embedding) != self.dimensions:
+            raise ValueError(
+                f"Expected {self.dimensions} dimensions, got {len(embedding)}"
+            )
+        key = cache_key(model, text)
+        with self._lock:
+            self._remember(key, embedding)
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if self._db.execute(
+                    "SELECT 1 FROM entries WHERE key = ?", (key,)
+                ).fetchone():
+                    self._db.execute("COMMIT")
+                    return
+                slot = self._allocate_slot()
+                self._write_slot(slot, key, embedding)
+                self._db.execute(
+                    "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                    (key, slot, time.time()),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            self._mmap.close()
+            self._db.close()
+
+    def _allocate_slot(self) -> int:
+        """Pick a free slot, evicting the least recently used entry if there is none.
+
+        Must be called inside a write transaction.
+        """
+        # entries are only removed by eviction, which hands the slot straight to the
+        # new entry, so occupied slots are always 0..count-1
+        (count,) = self._db.execute("SELECT count(*) FROM entries").fetchone()
+        if count < self.capacity:
+            return count
+        key, slot = self._db.execute(
+            "SELECT key, slot FROM entries ORDER BY last_used LIMIT 1"
+        ).fetchone()
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        return slot
+
+    def _read_slot(self, slot: int, key: bytes) -> list[float] | None:
+        offset = slot * self.slot_size
+        if self._mmap[offset : offset + DIGEST_SIZE] != key:
+            return None
+        vector = array("f")
+        vector.frombytes(self._mmap[offset + DIGEST_SIZE : offset + self.slot_size])
+        # another process may have reused the slot while we were copying it
+        if self._mmap[offset : offset + DIGEST_SIZE] != key:
+            return None
+        return vector.tolist()
+
+    def _write_slot(self, slot: int, key: bytes, embedding: list[float]) -> None:
+        offset = slot * self.slot_size
+        self._mmap[offset : offset + DIGEST_SIZE] = bytes(DIGEST_SIZE)
+        self._mmap[offset + DIGEST_SIZE : offset + self.slot_size] = array(
+            "f", embedding
+        ).tobytes()
+        self._mmap[offset : offset + DIGEST_SIZE] = key
+
+    def _remember(self, key: bytes, embedding: list[float]) -> None:
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+
+_default_cache: EmbeddingCache | None = None
+
+
+def default_cache() -> EmbeddingCache:
+    """Process-wide cache stored in `$EMBEDDING_CACHE_DIR`, `.embedding_cache` by default."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EmbeddingCache(
+            os.environ.get("EMBEDDING_CACHE_DIR", ".embedding_cache")
+        )
+    return _default_cache
+
+
+async def cached_embedding(
+    openai: AsyncOpenAI,
+    text: str,
+    model: str = EMBEDDING_MODEL,
+    cache: EmbeddingCache | None = None,
+) -> list[float]:
+    """Embed `text`, skipping the embeddings request if it's already cached."""
+    cache = cache or default_cache()
+    embedding = cache.get(model, text)
+    if embedding is not None:
+        return embedding
+
+    with logfire.span("create embedding for {text=}", text=text):
+        response = await openai.embeddings.create(input=text, model=model)
+    assert len(response.data) == 1, (
+        f"Expected 1 embedding, got {len(response.data)}, text: {text!r}"
+    )
+    embedding = response.data[0].embedding
+    cache.put(model, text, embedding)
+    return embedding
@@ -0,0 +1,178 @@
+from __future__ import annotations as _annotations
+
+import asyncio
+import random
+from collections.abc import AsyncIterator, Callable, Iterator, Sequence
+from dataclasses import dataclass, field
+from functools import cache
+from typing import TYPE_CHECKING, TypeVar
+
+import logfire
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+T = TypeVar("T")
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+# text-embedding-3-small returns a vector of 1536 floats
+EMBEDDING_DIMENSIONS = 1536
+
+# OpenAI accepts at most 2048 inputs and 300k tokens per embeddings request,
+# we stay well under the token limit so a single slow batch doesn't stall ingest.
+MAX_BATCH_INPUTS = 2048
+MAX_BATCH_TOKENS = 100_000
+# each individual input is limited to 8191 tokens
+MAX_INPUT_TOKENS = 8191
+
+
+@cache
+def retryable_errors() -> tuple[type[Exception], ...]:
+    # imported lazily, openai is slow to import
+    import openai
+
+    return (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap upper-ish estimate of the token count of `text`.
+
+    English text averages about four characters per token, which is close enough
+    to keep batches under the request limit without pulling in a tokenizer.
+    """
+    return len(text) // 4 + 1
+
+
+def token_batches(
+    items: Sequence[T],
+    text: Callable[[T], str],
+    max_tokens: int = MAX_BATCH_TOKENS,
+    max_inputs: int = MAX_BATCH_INPUTS,
+) -> Iterator[list[T]]:
+    """Group `items` into batches bounded by estimated tokens and number of inputs."""
+    batch: list[T] = []
+    batch_tokens = 0
+    for item in items:
+        tokens = min(estimate_tokens(text(item)), MAX_INPUT_TOKENS)
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_inputs):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+class AdaptiveLimiter:
+    """Concurrency limit which adapts to the provider's rate limits.
+
+    The limit grows by one after every successful request and halves whenever
+    the provider tells us to slow down (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 32):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self) -> AdaptiveLimiter:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self) -> None:
+        self.limit = min(self.limit + 1, self.maximum)
+
+    def on_throttle(self) -> None:
+        self.limit = max(self.limit // 2, self.minimum)
+
+
+@dataclass
+class BatchEmbedder:
+    """Embeds many texts using as few embeddings requests as possible."""
+
+    openai: AsyncOpenAI
+    model: str = EMBEDDING_MODEL
+    max_batch_tokens: int = MAX_BATCH_TOKENS
+    max_batch_inputs: int = MAX_BATCH_INPUTS
+    max_retries: int = 6
+    limiter: AdaptiveLimiter = field(default_factory=AdaptiveLimiter)
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """Embed `texts` with a single embeddings request, retrying if throttled."""
+        for attempt in range(self.max_retries + 1):
+            async with self.limiter:
+                try:
+                    with logfire.span(
+                        "create embeddings for {count} inputs", count=len(texts)
+                    ):
+                        response = await self.openai.embeddings.create(
+                            input=texts, model=self.model
+                        )
+                except retryable_errors() as e:
+                    if attempt == self.max_retries:
+                        raise
+                    self.limiter.on_throttle()
+                    delay = retry_after(e) or min(2**attempt, 30) * random.uniform(
+                        0.5, 1.0
+                    )
+                else:
+                    self.limiter.on_success()
+                    break
+            logfire.info(
+                "Embeddings request throttled, retrying in {delay:.2f}s", delay=delay
+            )
+            await asyncio.sleep(delay)
+
+        assert len(response.data) == len(texts), (
+            f"Expected {len(texts)} embeddings, got {len(response.data)}"
+        )
+        # the API documents `index` as the position of the input, don't rely on response order
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    async def embed_batches(
+        self, items: Sequence[T], text: Callable[[T], str]
+    ) -> AsyncIterator[tuple[list[T], list[list[float]]]]:
+        """Embed `items` in token-bounded batches, yielding each batch as it completes.
+
+        Requests run concurrently, gated by `limiter`.
+        """
+
+        async def run(batch: list[T]) -> tuple[list[T], list[list[float]]]:
+            return batch, await self.embed([text(item) for item in batch])
+
+        tasks = [
+            asyncio.create_task(run(batch))
+            for batch in token_batches(
+                items, text, self.max_batch_tokens, self.max_batch_inputs
+            )
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def retry_after(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
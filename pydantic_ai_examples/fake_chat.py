@@ -0,0 +1,149 @@
+"""A local stand-in for the OpenAI chat completions endpoint, with rate limits.
+
+Useful for exercising `batch.run_batch` without an API key, e.g.:
+
+    uv run -m pydantic_ai_examples.fake_chat [runs]
+"""
+
+from __future__ import annotations as _annotations
+
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+import httpx
+from openai import AsyncOpenAI
+from pydantic_ai import Agent
+from pydantic_ai.models.openai import OpenAIModel
+from pydantic_ai.providers.openai import OpenAIProvider
+
+from .batch import BatchScheduler, run_batch
+from .embeddings import estimate_tokens
+
+
+@dataclass
+class FakeChatServer:
+    """Serves `POST /v1/chat/completions` in-process through an `httpx.MockTransport`.
+
+    Limits are enforced over a sliding one second window, as providers do for
+    bursts, and requests over them get a 429 with `retry-after`.
+
+    Attributes:
+        latency: Seconds each request takes
+        requests_per_minute: Request limit, unlimited if `None`
+        tokens_per_minute: Prompt token limit, unlimited if `None`
+    """
+
+    latency: float = 0.05
+    requests_per_minute: int | None = None
+    tokens_per_minute: int | None = None
+    requests: int = 0
+    throttled: int = 0
+    window: deque[tuple[float, int]] = field(default_factory=deque, init=False)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.rstrip("/") != "/v1/chat/completions":
+            return httpx.Response(404, json={"error": {"message": "not found"}})
+        body = json.loads(request.content)
+        tokens = sum(
+            estimate_tokens(json.dumps(message["content"]))
+            for message in body["messages"]
+        )
+
+        now = time.monotonic()
+        while self.window and self.window[0][0] <= now - 1:
+            self.window.popleft()
+        over_requests = (
+            self.requests_per_minute is not None
+            and len(self.window) >= self.requests_per_minute / 60
+        )
+        over_tokens = (
+            self.tokens_per_minute is not None
+            and sum(t for _, t in self.window) + tokens > self.tokens_per_minute / 60
+        )
+        if over_requests or over_tokens:
+            self.throttled += 1
+            retry_after = self.window[0][0] + 1 - now if self.window else 1
+            return httpx.Response(
+                429,
+                headers={"retry-after": f"{retry_after:.3f}"},
+                json={"error": {"message": "rate limited", "type": "requests"}},
+            )
+        self.window.append((now, tokens))
+
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return httpx.Response(
+            200,
+            json={
+                "id": f"chatcmpl-{self.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": "ok"},
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": tokens,
+                    "completion_tokens": 1,
+                    "total_tokens": tokens + 1,
+                },
+            },
+        )
+
+    def client(self) -> AsyncOpenAI:
+        """An `AsyncOpenAI` client whose requests are answered by this server."""
+        return AsyncOpenAI(
+            api_key="fake",
+            base_url="http://fake-openai/v1",
+            max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.handle)),
+        )
+
+    def model(self) -> OpenAIModel:
+        return OpenAIModel(
+            "gpt-4o", provider=OpenAIProvider(openai_client=self.client())
+        )
+
+
+async def benchmark(runs: int = 300, requests_per_minute: int = 3_000) -> None:
+    """Compare sequential runs with batches, with and without a scheduler."""
+    prompts = [(f"Extract the dimensions of box {i}", None) for i in range(runs)]
+
+    server = FakeChatServer(requests_per_minute=requests_per_minute)
+    agent = Agent(server.model())
+    start = time.perf_counter()
+    for prompt, _ in prompts:
+        await agent.run(prompt)
+    print(f"sequential: {runs} runs in {time.perf_counter() - start:.2f}s")
+
+    for name, scheduler in (
+        ("batch, retry on 429 only", None),
+        (
+            "batch, scheduled",
+            BatchScheduler(requests_per_minute=requests_per_minute),
+        ),
+    ):
+        server = FakeChatServer(requests_per_minute=requests_per_minute)
+        agent = Agent(server.model())
+        start = time.perf_counter()
+        results = await run_batch(
+            agent, prompts, scheduler, max_concurrency=runs, return_exceptions=True
+        )
+        failed = sum(isinstance(result, Exception) for result in results)
+        print(
+            f"{name}: {runs} runs in {time.perf_counter() - start:.2f}s, "
+            f"{server.throttled} requests throttled, {failed} runs failed"
+        )
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    asyncio.run(benchmark(n))
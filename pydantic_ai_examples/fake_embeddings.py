@@ -0,0 +1,135 @@
+"""A local stand-in for the OpenAI embeddings endpoint.
+
+Useful for exercising the embedding pipelines without an API key, e.g.:
+
+    uv run -m pydantic_ai_examples.fake_embeddings
+"""
+
+from __future__ import annotations as _annotations
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+
+import httpx
+from openai import AsyncOpenAI
+
+from .embeddings import EMBEDDING_DIMENSIONS, BatchEmbedder, estimate_tokens
+
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> list[float]:
+    """Deterministic unit vector derived from the hash of `text`."""
+    rng = random.Random(hashlib.sha256(text.encode()).digest())
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector]
+
+
+@dataclass
+class FakeEmbeddingsServer:
+    """Serves `POST /v1/embeddings` in-process through an `httpx.MockTransport`.
+
+    Attributes:
+        latency: Seconds each request takes, regardless of its size
+        max_concurrency: Requests in flight above this get a 429 with `retry-after`
+        dimensions: Length of the returned vectors
+    """
+
+    latency: float = 0.1
+    max_concurrency: int | None = None
+    dimensions: int = EMBEDDING_DIMENSIONS
+    requests: int = 0
+    inputs: int = 0
+    throttled: int = 0
+    in_flight: int = field(default=0, init=False)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.rstrip("/") != "/v1/embeddings":
+            return httpx.Response(404, json={"error": {"message": "not found"}})
+        if self.max_concurrency is not None and self.in_flight >= self.max_concurrency:
+            self.throttled += 1
+            return httpx.Response(
+                429,
+                headers={"retry-after": "0.05"},
+                json={"error": {"message": "rate limited", "type": "requests"}},
+            )
+
+        self.in_flight += 1
+        try:
+            body = json.loads(request.content)
+            texts = body["input"]
+            if isinstance(texts, str):
+                texts = [texts]
+            self.requests += 1
+            self.inputs += len(texts)
+            await asyncio.sleep(self.latency)
+            data = [
+                {
+                    "object": "embedding",
+                    "index": index,
+                    "embedding": fake_embedding(text, self.dimensions),
+                }
+                for index, text in enumerate(texts)
+            ]
+            tokens = sum(estimate_tokens(text) for text in texts)
+            return httpx.Response(
+                200,
+                json={
+                    "object": "list",
+                    "data": data,
+                    "model": body["model"],
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                },
+            )
+        finally:
+            self.in_flight -= 1
+
+    def client(self) -> AsyncOpenAI:
+        """An `AsyncOpenAI` client whose requests are answered by this server."""
+        return AsyncOpenAI(
+            api_key="fake",
+            base_url="http://fake-openai/v1",
+            max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.handle)),
+        )
+
+
+async def benchmark(sections: int = 2_000, section_chars: int = 2_000) -> None:
+    """Compare one request per section with the batched embedder."""
+    texts = [f"section {i} " + "x" * section_chars for i in range(sections)]
+
+    server = FakeEmbeddingsServer(max_concurrency=10)
+    openai = server.client()
+    sem = asyncio.Semaphore(10)
+
+    async def embed_one(text: str) -> None:
+        async with sem:
+            await openai.embeddings.create(input=text, model="text-embedding-3-small")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(embed_one(text) for text in texts))
+    print(
+        f"per-section: {server.requests} requests in {time.perf_counter() - start:.2f}s"
+    )
+
+    server = FakeEmbeddingsServer(max_concurrency=10)
+    embedder = BatchEmbedder(server.client())
+    start = time.perf_counter()
+    embedded = 0
+    async for batch, _ in embedder.embed_batches(texts, lambda text: text):
+        embedded += len(batch)
+    print(
+        f"batched: {server.requests} requests for {embedded} sections "
+        f"in {time.perf_counter() - start:.2f}s "
+        f"({server.throttled} throttled, final concurrency {embedder.limiter.limit})"
+    )
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    asyncio.run(benchmark(n))
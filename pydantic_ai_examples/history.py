@@ -0,0 +1,265 @@
+"""Bounded message history for long conversations.
+
+Passing every earlier message back as `message_history` resends the whole
+transcript each turn, so a conversation's token cost grows quadratically with its
+length. `CompactingHistory` keeps the full transcript, but what it sends is:
+
+- the original system prompt, plus a summary of the older turns. The summary is
+  extended incrementally, a few turns at a time, and reused between turns.
+- the most recent turns verbatim, with the content of older tool returns elided
+  once they exceed a token budget. A model which needs them can call the tool again.
+
+    history = CompactingHistory("openai:gpt-4o-mini")
+    result = await history.run(agent, "What was his most famous equation?")
+
+Compare per-turn tokens and latency with the full transcript over a 200 turn
+conversation, using a stub model, with:
+
+    uv run -m pydantic_ai_examples.history [turns]
+"""
+
+from __future__ import annotations as _annotations
+
+import asyncio
+import sys
+import time
+from dataclasses import replace
+from typing import Any, TypeVar
+
+from pydantic_ai import Agent
+from pydantic_ai.agent import AgentRunResult
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_ai.models import KnownModelName, Model
+from pydantic_ai.usage import Usage
+
+from .embeddings import estimate_tokens
+
+OutputT = TypeVar("OutputT")
+
+summary_agent = Agent(
+    output_type=str,
+    system_prompt=(
+        "You maintain a running summary of a conversation between a user and an "
+        "assistant. Extend the summary with the new turns given. Keep the facts, "
+        "names, numbers and decisions later turns may depend on, drop small talk. "
+        "Reply with the updated summary only."
+    ),
+)
+
+
+def _is_turn_start(message: ModelMessage) -> bool:
+    return isinstance(message, ModelRequest) and any(
+        isinstance(part, UserPromptPart) for part in message.parts
+    )
+
+
+def render(messages: list[ModelMessage], max_tool_tokens: int = 200) -> str:
+    """Plain text transcript of `messages`, for the summarizer."""
+    lines: list[str] = []
+    for message in messages:
+        for part in message.parts:
+            if isinstance(part, UserPromptPart):
+                content = part.content
+                lines.append(f"User: {content if isinstance(content, str) else '…'}")
+            elif isinstance(part, TextPart):
+                lines.append(f"Assistant: {part.content}")
+            elif isinstance(part, ToolCallPart):
+                lines.append(
+                    f"Assistant called {part.tool_name}({part.args_as_json_str()})"
+                )
+            elif isinstance(part, ToolReturnPart):
+                content = part.model_response_str()
+                # about four characters per token
+                if estimate_tokens(content) > max_tool_tokens:
+                    content = content[: max_tool_tokens * 4] + "…"
+                lines.append(f"{part.tool_name} returned: {content}")
+    return "\n".join(lines)
+
+
+class CompactingHistory:
+    """A conversation's transcript, and the compacted history to send each turn.
+
+    Args:
+        model: Model which summarizes older turns
+        keep_turns: Turns always sent verbatim, a turn starting at each user prompt.
+            Up to twice as many are kept, older turns are summarized `keep_turns` at
+            a time
+        tool_return_budget: Estimated tokens of tool return content sent, content of
+            older tool returns beyond it is elided
+    """
+
+    def __init__(
+        self,
+        model: Model | KnownModelName,
+        keep_turns: int = 4,
+        tool_return_budget: int = 2_000,
+    ):
+        self.model = model
+        self.keep_turns = keep_turns
+        self.tool_return_budget = tool_return_budget
+        self.messages: list[ModelMessage] = []
+        self.summary: str | None = None
+        self.summary_usage = Usage()
+        # messages of `self.messages` folded into `self.summary`
+        self._summarized = 0
+        self._lock = asyncio.Lock()
+
+    def add(self, messages: list[ModelMessage]) -> None:
+        """Append a run's new messages to the transcript."""
+        self.messages.extend(messages)
+
+    async def compact(self) -> list[ModelMessage]:
+        """The message history to send with the next run."""
+        async with self._lock:
+            await self._summarize_older_turns()
+        recent = self._elide_tool_returns(self.messages[self._summarized :])
+        if not self.summary:
+            return recent
+
+        # the original system prompt is only sent by the agent on a run without history
+        first = self.messages[0]
+        system_parts = [
+            part
+            for part in (first.parts if isinstance(first, ModelRequest) else [])
+            if isinstance(part, SystemPromptPart)
+        ]
+        summary = SystemPromptPart(
+            f"Summary of the conversation so far:\n{self.summary}"
+        )
+        return [ModelRequest(parts=[*system_parts, summary]), *recent]
+
+    async def run(
+        self, agent: Agent[Any, OutputT], user_prompt: str, **kwargs: Any
+    ) -> AgentRunResult[OutputT]:
+        """Run `agent` with the compacted history, and add its new messages."""
+        result = await agent.run(
+            user_prompt, message_history=await self.compact(), **kwargs
+        )
+        self.add(result.new_messages())
+        return result
+
+    async def _summarize_older_turns(self) -> None:
+        starts = [
+            i
+            for i, message in enumerate(self.messages)
+            if i >= self._summarized and _is_turn_start(message)
+        ]
+        if len(starts) < self.keep_turns * 2:
+            return
+        end = starts[-self.keep_turns]
+        prompt = render(self.messages[self._summarized : end])
+        if self.summary:
+            prompt = f"Summary so far:\n{self.summary}\n\nNew turns:\n{prompt}"
+        result = await summary_agent.run(prompt, model=self.model)
+        self.summary = result.output
+        self.summary_usage.incr(result.usage())
+        self._summarized = end
+
+    def _elide_tool_returns(self, messages: list[ModelMessage]) -> list[ModelMessage]:
+        """Copy of `messages` without the content of tool returns over the budget.
+
+        The newest tool returns are kept, the transcript itself isn't changed.
+        """
+        budget = self.tool_return_budget
+        compacted: list[ModelMessage] = []
+        for message in reversed(messages):
+            if isinstance(message, ModelRequest):
+                parts = []
+                for part in message.parts:
+                    if isinstance(part, ToolReturnPart):
+                        tokens = estimate_tokens(part.model_response_str())
+                        if tokens > budget:
+                            part = replace(
+                                part,
+                                content=f"[{tokens} tokens elided, call "
+                                f"{part.tool_name} again if they're needed]",
+                            )
+                        budget = max(budget - tokens, 0)
+                    parts.append(part)
+                message = replace(message, parts=parts)
+            compacted.append(message)
+        compacted.reverse()
+        return compacted
+
+
+async def benchmark(turns: int = 200, seconds_per_1k_tokens: float = 0.002) -> None:
+    """Tokens sent and latency per turn with the full transcript and compacted.
+
+    The stub models take `seconds_per_1k_tokens` per thousand input tokens, and the
+    chat model calls a tool returning about 1,000 tokens every other turn. Tokens
+    sent to the summarizer count towards the compacted conversation's turns.
+    """
+    from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+    sent: list[int] = []
+    summarized: list[int] = []
+
+    async def input_tokens(messages: list[ModelMessage]) -> int:
+        system = sum(
+            estimate_tokens(part.content)
+            for message in messages
+            for part in message.parts
+            if isinstance(part, SystemPromptPart)
+        )
+        tokens = system + estimate_tokens(render(messages, max_tool_tokens=sys.maxsize))
+        sent.append(tokens)
+        await asyncio.sleep(tokens / 1000 * seconds_per_1k_tokens)
+        return tokens
+
+    async def chat(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        tokens = await input_tokens(messages)
+        last = messages[-1].parts[-1]
+        if isinstance(last, UserPromptPart) and "order" in last.content:
+            return ModelResponse(parts=[ToolCallPart("lookup_order", {"order": 1})])
+        return ModelResponse(parts=[TextPart(f"Answer based on {tokens} tokens.")])
+
+    async def summarize(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        tokens = await input_tokens(messages)
+        summarized.append(tokens)
+        return ModelResponse(parts=[TextPart(f"{tokens} tokens summarized.")])
+
+    agent = Agent(FunctionModel(chat), system_prompt="You are a support agent.")
+
+    @agent.tool_plain
+    def lookup_order(order: int) -> str:
+        """Look up an order."""
+        return f"Order {order}: " + "line item, " * 1_000
+
+    for name in ("full transcript", "compacted"):
+        history = CompactingHistory(FunctionModel(summarize))
+        messages: list[ModelMessage] = []
+        sent.clear()
+        summarized.clear()
+        tokens_per_turn: list[int] = []
+        latencies: list[float] = []
+        for turn in range(turns):
+            topic = "my order" if turn % 2 else "the weather"
+            prompt = f"Question {turn} about {topic}, with a little context."
+            already_sent = len(sent)
+            start = time.perf_counter()
+            if name == "compacted":
+                await history.run(agent, prompt)
+            else:
+                result = await agent.run(prompt, message_history=messages)
+                messages.extend(result.new_messages())
+            latencies.append(time.perf_counter() - start)
+            tokens_per_turn.append(sum(sent[already_sent:]))
+        print(
+            f"{name:<15}: {sum(tokens_per_turn):>10,} tokens sent "
+            f"({sum(summarized):,} to the summarizer), "
+            f"{tokens_per_turn[-1]:>7,} in the last turn, "
+            f"{latencies[-1] * 1e3:6.1f}ms last turn, {sum(latencies):6.2f}s total"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -0,0 +1,127 @@
+"""Process-wide HTTP connection pools, one per model provider.
+
+Every agent and client in a process which talks to the same provider should share
+one `httpx.AsyncClient`, so they reuse warm (already TLS-negotiated) connections
+rather than each opening their own. `http_pools` holds one client per provider,
+with configurable pool limits, keep-alive and optionally HTTP/2 (which needs
+`pip install 'httpx[http2]'`), and counts requests and newly opened connections
+so reuse can be checked with `http_pools.stats()`.
+
+Build models on the shared pools with `shared_model("openai:gpt-4o")`.
+"""
+
+from __future__ import annotations as _annotations
+
+import threading
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any
+
+import httpx
+
+from .resources import resources
+
+if TYPE_CHECKING:
+    from pydantic_ai.models import Model
+
+
+@dataclass
+class PoolConfig:
+    """Limits of a provider's connection pool, timeouts match the OpenAI client's."""
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+    timeout: float = 600.0
+    connect_timeout: float = 5.0
+
+
+@dataclass
+class PoolStats:
+    requests: int = 0
+    connections_opened: int = 0
+
+
+class HttpPools:
+    """One lazily created `httpx.AsyncClient` per provider."""
+
+    def __init__(self):
+        self._configs: dict[str, PoolConfig] = {}
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._stats: dict[str, PoolStats] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, provider: str, config: PoolConfig) -> None:
+        """Set the pool limits for `provider`, before its client is first used."""
+        with self._lock:
+            if provider in self._clients:
+                raise ValueError(f"The {provider!r} pool has already been created")
+            self._configs[provider] = config
+
+    def client(self, provider: str) -> httpx.AsyncClient:
+        with self._lock:
+            client = self._clients.get(provider)
+            # e.g. closed by a client which was handed it, such as `AsyncOpenAI.close()`
+            if client is None or client.is_closed:
+                client = self._clients[provider] = self._create(provider)
+            return client
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {provider: asdict(stats) for provider, stats in self._stats.items()}
+
+    async def aclose(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+    def _create(self, provider: str) -> httpx.AsyncClient:
+        config = self._configs.get(provider, PoolConfig())
+        stats = self._stats.setdefault(provider, PoolStats())
+
+        async def trace(event: str, info: dict[str, Any]) -> None:
+            if event == "connection.connect_tcp.complete":
+                stats.connections_opened += 1
+
+        async def on_request(request: httpx.Request) -> None:
+            stats.requests += 1
+            request.extensions["trace"] = trace
+
+        return httpx.AsyncClient(
+            http2=config.http2,
+            limits=httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive_connections,
+                keepalive_expiry=config.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(config.timeout, connect=config.connect_timeout),
+            event_hooks={"request": [on_request]},
+        )
+
+
+http_pools = HttpPools()
+resources.on_shutdown(http_pools.aclose)
+
+
+def shared_model(model: str) -> Model:
+    """Model for a `provider:name` string whose provider uses the shared pool.
+
+    Only `openai:` and `google-gla:` models are supported.
+    """
+    provider, _, name = model.partition(":")
+    if provider == "openai":
+        from pydantic_ai.models.openai import OpenAIModel
+        from pydantic_ai.providers.openai import OpenAIProvider
+
+        return OpenAIModel(
+            name, provider=OpenAIProvider(http_client=http_pools.client(provider))
+        )
+    if provider == "google-gla":
+        from pydantic_ai.models.gemini import GeminiModel
+        from pydantic_ai.providers.google_gla import GoogleGLAProvider
+
+        return GeminiModel(
+            name, provider=GoogleGLAProvider(http_client=http_pools.client(provider))
+        )
+    raise ValueError(f"No shared pool for {model!r}, expected openai: or google-gla:")
@@ -0,0 +1,215 @@
+"""Batch ingestion of an archive of exam papers into the question database.
+
+Papers are PDFs anywhere under a directory, described by a `manifest.json` at its
+root which maps each paper's path (relative to the directory) to its metadata:
+
+    {
+        "kcse/2024/cre-paper-1.pdf": {"exam_name": "KCSE", "subject": "CRE", "year": "2024"}
+    }
+
+Papers are extracted and loaded concurrently, up to a fixed number at a time.
+Progress is checkpointed to `.ingest/state.json` in the directory after every
+step, keyed on the SHA-256 of each paper, and extracted questions are kept next to
+it, so a crashed run picks up where it stopped: loaded papers are skipped and
+papers which were extracted but not loaded are loaded without being re-extracted.
+
+Run with:
+
+    uv run -m pydantic_ai_examples.ingest <papers_dir> [max_concurrency]
+"""
+
+from __future__ import annotations as _annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Literal
+
+import logfire
+from pydantic import BaseModel, TypeAdapter
+
+from . import model
+from .pdf import map_file
+from .question_extractor import (
+    Deps,
+    extract_from_pdf,
+    get_sessionmaker,
+    load_data_into_milvus,
+)
+from .resources import get_openai, resources
+
+MANIFEST_NAME = "manifest.json"
+STATE_DIR = ".ingest"
+MAX_CONCURRENT_PAPERS = 4
+
+Status = Literal["extracted", "loaded", "no_questions", "failed"]
+
+
+class PaperMetadata(BaseModel):
+    exam_name: str
+    subject: str
+    year: str
+
+
+manifest_adapter = TypeAdapter(dict[str, PaperMetadata])
+
+
+def read_manifest(papers_dir: Path) -> dict[str, PaperMetadata]:
+    return manifest_adapter.validate_json((papers_dir / MANIFEST_NAME).read_bytes())
+
+
+class Checkpoint:
+    """Progress of an ingest run, persisted after every change.
+
+    The state file is replaced atomically, so a crash mid-write leaves the
+    previous checkpoint intact rather than a truncated file.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.path = directory / "state.json"
+        self.extracted_dir = directory / "extracted"
+        self.extracted_dir.mkdir(parents=True, exist_ok=True)
+        self.papers: dict[str, dict[str, str]] = (
+            json.loads(self.path.read_bytes()) if self.path.exists() else {}
+        )
+
+    def status(self, digest: str) -> Status | None:
+        state = self.papers.get(digest)
+        return state["status"] if state else None  # type: ignore[return-value]
+
+    def record(self, digest: str, path: str, status: Status, **extra: str) -> None:
+        self.papers[digest] = {"path": path, "status": status, **extra}
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("w") as f:
+            json.dump(self.papers, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def save_questions(self, digest: str, questions: model.Questions) -> None:
+        path = self.extracted_dir / f"{digest}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(questions.model_dump_json())
+        os.replace(tmp, path)
+
+    def load_questions(self, digest: str) -> model.Questions:
+        return model.Questions.model_validate_json(
+            (self.extracted_dir / f"{digest}.json").read_bytes()
+        )
+
+
+@dataclass
+class IngestSummary:
+    loaded: int = 0
+    skipped: int = 0
+    no_questions: int = 0
+    failed: int = 0
+
+
+async def ingest_archive(
+    papers_dir: str | Path,
+    max_concurrency: int = MAX_CONCURRENT_PAPERS,
+    chunked: bool = False,
+) -> IngestSummary:
+    """Extract and load every paper in `papers_dir` listed in its manifest.
+
+    Args:
+        papers_dir: Directory holding the papers and `manifest.json`
+        max_concurrency: Maximum number of papers processed at once
+        chunked: Extract each paper from overlapping page windows
+
+    Returns:
+        IngestSummary: Number of papers in each outcome
+    """
+    papers_dir = Path(papers_dir)
+    manifest = read_manifest(papers_dir)
+    checkpoint = Checkpoint(papers_dir / STATE_DIR)
+
+    papers: list[tuple[str, PaperMetadata]] = []
+    for path in sorted(papers_dir.rglob("*.pdf")):
+        name = path.relative_to(papers_dir).as_posix()
+        if name.startswith(f"{STATE_DIR}/"):
+            continue
+        if (metadata := manifest.get(name)) is None:
+            logfire.warn("{name} is not in the manifest, skipping", name=name)
+        else:
+            papers.append((name, metadata))
+    for name in manifest.keys() - {name for name, _ in papers}:
+        logfire.warn("{name} is in the manifest but doesn't exist", name=name)
+
+    openai = get_openai()
+    sessionmaker = get_sessionmaker()
+    deps = Deps(openai=openai, sessionmaker=sessionmaker)
+    summary = IngestSummary()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def ingest(name: str, metadata: PaperMetadata) -> None:
+        async with semaphore:
+            data = map_file(papers_dir / name)
+            # hashing reads the whole file, keep it off the event loop
+            digest = (await asyncio.to_thread(hashlib.sha256, data)).hexdigest()
+            status = checkpoint.status(digest)
+            if status in ("loaded", "no_questions"):
+                summary.skipped += 1
+                return
+            with logfire.span("ingest {name}", name=name):
+                try:
+                    if status == "extracted":
+                        questions = checkpoint.load_questions(digest)
+                    else:
+                        output = await extract_from_pdf(data, deps, chunked=chunked)
+                        if not isinstance(output, model.Questions):
+                            checkpoint.record(digest, name, "no_questions")
+                            summary.no_questions += 1
+                            return
+                        questions = output
+                        checkpoint.save_questions(digest, questions)
+                        checkpoint.record(digest, name, "extracted")
+
+                    async with sessionmaker() as session:
+                        await load_data_into_milvus(
+                            questions.questions,
+                            openai,
+                            session,
+                            exam_name=metadata.exam_name,
+                            subject=metadata.subject,
+                            year=metadata.year,
+                        )
+                except Exception as e:
+                    logfire.exception("Failed to ingest {name}", name=name)
+                    # keep the extracted questions, a retry only needs to load them
+                    if checkpoint.status(digest) != "extracted":
+                        checkpoint.record(digest, name, "failed", error=str(e))
+                    summary.failed += 1
+                else:
+                    checkpoint.record(digest, name, "loaded")
+                    summary.loaded += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(ingest(name, metadata) for name, metadata in papers))
+    logfire.info(
+        "Ingested {papers} papers in {elapsed:.1f}s: {summary}",
+        papers=len(papers),
+        elapsed=time.perf_counter() - start,
+        summary=summary,
+    )
+    return summary
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(
+            "Usage: python -m pydantic_ai_examples.ingest <papers_dir> [max_concurrency]",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else MAX_CONCURRENT_PAPERS
+    summary = asyncio.run(resources.run(ingest_archive(sys.argv[1], concurrency)))
+    print(summary)
+    sys.exit(1 if summary.failed else 0)
@@ -0,0 +1,188 @@
+"""Run agents from synchronous code on a dedicated background event loop.
+
+`Agent.run_sync` drives the agent on the calling thread's event loop, so the
+examples call `nest_asyncio.apply()` to let it run where a loop is already
+running. That patches asyncio globally, for every library in the process.
+
+Instead, `run_sync` here submits the run to one event loop which lives for the
+whole process in a daemon thread. Synchronous callers, such as Django or Flask
+workers, share that loop, so HTTP clients and connection pools created on it are
+reused from call to call. Resources registered in `resources` are started on the
+loop when it starts and closed on it at exit.
+
+Compare the per-call overhead with `nest_asyncio` with:
+
+    uv run -m pydantic_ai_examples.loop_thread
+"""
+
+from __future__ import annotations as _annotations
+
+import asyncio
+import atexit
+import subprocess
+import sys
+import threading
+import time
+from collections.abc import Coroutine
+from typing import Any, TypeVar
+
+from pydantic_ai import Agent
+from pydantic_ai.agent import AgentRunResult
+
+from .resources import resources
+
+T = TypeVar("T")
+OutputT = TypeVar("OutputT")
+
+
+class LoopThread:
+    """An event loop running forever in a daemon thread, started on first use."""
+
+    def __init__(self, name: str = "pydantic-ai-examples-loop"):
+        self.name = name
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=loop.run_forever, name=self.name, daemon=True
+                )
+                self._thread.start()
+                try:
+                    asyncio.run_coroutine_threadsafe(resources.startup(), loop).result()
+                except BaseException:
+                    # don't leave a loop thread behind for every failed attempt
+                    loop.call_soon_threadsafe(loop.stop)
+                    self._thread.join()
+                    self._thread = None
+                    loop.close()
+                    raise
+                self._loop = loop
+                atexit.register(self.stop)
+            return self._loop
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """Run `coro` on the loop and block until it's done."""
+        try:
+            loop = self.loop
+        except BaseException:
+            coro.close()
+            raise
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            coro.close()
+            raise RuntimeError(
+                "Can't block on the background loop from inside it, await instead"
+            )
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        try:
+            return future.result()
+        except BaseException:
+            # e.g. KeyboardInterrupt, don't leave the coroutine running
+            future.cancel()
+            raise
+
+    def stop(self) -> None:
+        """Close the registered resources, then stop the loop and its thread."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or thread is None:
+            return
+        atexit.unregister(self.stop)
+        asyncio.run_coroutine_threadsafe(resources.shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+loop_thread = LoopThread()
+
+
+def run_coroutine(coro: Coroutine[Any, Any, T]) -> T:
+    """Run `coro` on the shared background loop from synchronous code."""
+    return loop_thread.run(coro)
+
+
+def run_sync(
+    agent: Agent[Any, OutputT], user_prompt: Any = None, **kwargs: Any
+) -> AgentRunResult[OutputT]:
+    """Drop-in replacement for `agent.run_sync` which runs on the background loop."""
+    return loop_thread.run(agent.run(user_prompt, **kwargs))
+
+
+def _time_calls(mode: str, calls: int) -> tuple[float, float]:
+    """Seconds per `run_sync` call, and per run when 50 runs are gathered in one call."""
+    from pydantic_ai.models.test import TestModel
+
+    agent = Agent(TestModel())
+
+    async def gathered() -> None:
+        await asyncio.gather(*(agent.run("hello") for _ in range(50)))
+
+    if mode == "nest_asyncio":
+        import nest_asyncio
+
+        nest_asyncio.apply()
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+        def call() -> object:
+            return agent.run_sync("hello")
+
+        def call_gathered() -> None:
+            loop.run_until_complete(gathered())
+    else:
+
+        def call() -> object:
+            return run_sync(agent, "hello")
+
+        def call_gathered() -> None:
+            run_coroutine(gathered())
+
+    call()  # warm up
+    start = time.perf_counter()
+    for _ in range(calls):
+        call()
+    per_call = (time.perf_counter() - start) / calls
+
+    start = time.perf_counter()
+    for _ in range(calls // 50):
+        call_gathered()
+    per_gathered_run = (time.perf_counter() - start) / (calls // 50 * 50)
+    return per_call, per_gathered_run
+
+
+def benchmark(calls: int = 2_000) -> None:
+    """Overhead of each mode, each in a fresh interpreter.
+
+    `nest_asyncio` patches asyncio for the whole process, so the modes can't share
+    one.
+    """
+    for mode in ("nest_asyncio", "loop_thread"):
+        result = subprocess.run(
+            [sys.executable, "-m", __spec__.name, mode, str(calls)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        per_call, per_gathered_run = map(float, result.stdout.split())
+        print(
+            f"{mode:<12}: {per_call * 1e6:6.1f}µs per run_sync call, "
+            f"{per_gathered_run * 1e6:6.1f}µs per run when gathered"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        print(*_time_calls(sys.argv[1], int(sys.argv[2])))
+    else:
+        benchmark()
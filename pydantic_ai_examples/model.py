@@ -40,6 +40,9 @@ class RetrievedQuestion(BaseModel):
     marks: Optional[int] = Field(
         description="Marks allocated (if specified)", default=None
     )
+    score: Optional[float] = Field(
+        description="Similarity to the search query, higher is closer", default=None
+    )
 
 
 class RetrievedQuestions(BaseModel):
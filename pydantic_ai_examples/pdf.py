@@ -0,0 +1,246 @@
+"""PDF helpers for question extraction.
+
+Splitting needs `pypdf`, install it with `pip install pypdf`.
+
+Compare peak memory of reading PDFs into memory against memory-mapping them with:
+
+    uv run -m pydantic_ai_examples.pdf bench
+"""
+
+from __future__ import annotations as _annotations
+
+import asyncio
+import io
+import mmap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+
+from pydantic_ai.messages import (
+    BinaryContent,
+    ModelMessage,
+    ModelRequest,
+    ModelRequestPart,
+    UserPromptPart,
+)
+
+from . import model
+from .resources import resources
+
+get_process_pool = resources.register(
+    "pdf_process_pool",
+    lambda: ProcessPoolExecutor(max_workers=os.cpu_count()),
+    close=lambda pool: pool.shutdown(),
+)
+
+
+def map_file(path: str | Path) -> memoryview:
+    """Memory-map `path` read-only, without copying it into memory.
+
+    The pages are file-backed, the OS reads them in when they're touched (e.g. when
+    a request base64-encodes them) and can drop them again under memory pressure.
+    The mapping is closed once the returned view is garbage collected.
+
+    pydantic can't serialize a `memoryview`, so messages holding it as
+    `BinaryContent.data` can't be dumped, e.g. with `result.all_messages_json()`.
+    Pass them through `persistable` first.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # empty files can't be mapped
+            return memoryview(b"")
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def persistable(messages: list[ModelMessage]) -> list[ModelMessage]:
+    """Copy of `messages` with memory-mapped `BinaryContent` copied into `bytes`."""
+    copied: list[ModelMessage] = []
+    for message in messages:
+        if isinstance(message, ModelRequest):
+            parts: list[ModelRequestPart] = []
+            for part in message.parts:
+                if isinstance(part, UserPromptPart) and not isinstance(
+                    part.content, str
+                ):
+                    content = [
+                        replace(item, data=bytes(item.data))
+                        if isinstance(item, BinaryContent)
+                        and isinstance(item.data, memoryview)
+                        else item
+                        for item in part.content
+                    ]
+                    part = replace(part, content=content)
+                parts.append(part)
+            message = replace(message, parts=parts)
+        copied.append(message)
+    return copied
+
+
+def _reader(data: bytes):
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise ImportError(
+            "Splitting PDFs requires pypdf, install it with `pip install pypdf`"
+        ) from e
+    return PdfReader(io.BytesIO(data))
+
+
+def page_count(data: bytes) -> int:
+    return len(_reader(data).pages)
+
+
+def extract_pages(data: bytes, start: int, stop: int) -> bytes:
+    """Return a new PDF holding pages `start` to `stop` (exclusive) of `data`."""
+    from pypdf import PdfWriter
+
+    reader = _reader(data)
+    writer = PdfWriter()
+    for page in reader.pages[start:stop]:
+        writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def window_ranges(pages: int, window: int, overlap: int) -> list[tuple[int, int]]:
+    """Page ranges of `window` pages, consecutive ranges sharing `overlap` pages."""
+    if not 0 <= overlap < window:
+        raise ValueError(f"overlap must be in [0, {window}), got {overlap}")
+    step = window - overlap
+    return [
+        (start, min(start + window, pages))
+        for start in range(0, max(pages - overlap, 1), step)
+    ]
+
+
+async def page_windows(
+    data: bytes | memoryview, window: int, overlap: int
+) -> list[bytes]:
+    """Split the PDF in `data` into overlapping windows of pages.
+
+    Splitting is CPU bound, so windows are cut in parallel in the process pool.
+    """
+    # workers receive a pickled copy anyway, and memory maps can't be pickled
+    data = bytes(data)
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    pages = await loop.run_in_executor(pool, page_count, data)
+    return await asyncio.gather(
+        *(
+            loop.run_in_executor(pool, extract_pages, data, start, stop)
+            for start, stop in window_ranges(pages, window, overlap)
+        )
+    )
+
+
+def merge_questions(results: list[model.Questions]) -> model.Questions:
+    """Merge questions extracted from overlapping windows.
+
+    A question cut by a window boundary appears in both windows, parts are
+    de-duplicated by (question_number, part_label), keeping the longest content,
+    since the shorter copy is the one which was cut off.
+    """
+    merged: dict[str, dict[str | None, model.QuestionPart]] = {}
+    for questions in results:
+        for question in questions.questions:
+            parts = merged.setdefault(question.question_number, {})
+            for part in question.parts:
+                current = parts.get(part.part_label)
+                if current is None:
+                    parts[part.part_label] = part
+                elif len(part.content) > len(current.content):
+                    parts[part.part_label] = part.model_copy(
+                        update={"marks": part.marks or current.marks}
+                    )
+                elif current.marks is None and part.marks is not None:
+                    parts[part.part_label] = current.model_copy(
+                        update={"marks": part.marks}
+                    )
+    return model.Questions(
+        questions=[
+            model.ExamQuestion(question_number=number, parts=list(parts.values()))
+            for number, parts in merged.items()
+        ]
+    )
+
+
+async def benchmark_memory(
+    sizes_mb: tuple[int, ...] = (1, 4, 16), concurrency: int = 16
+) -> None:
+    """Peak memory of concurrent extractions, reading PDFs vs memory-mapping them.
+
+    Each extraction sends its PDF to a fake OpenAI endpoint which holds the request
+    for a moment, so every request is in flight at once. Memory is the peak of
+    Python allocations traced by `tracemalloc`: with `read_bytes` every run holds a
+    private copy of its file for the whole run, with `map_file` the file's pages
+    are shared, reclaimable page cache and only the base64 request body is
+    allocated while the request is in flight. The chat completions API needs the
+    document inlined in the JSON body, so that part still grows with the file.
+    """
+    import tempfile
+    import tracemalloc
+
+    import httpx
+    from openai import AsyncOpenAI
+    from pydantic_ai import Agent
+    from pydantic_ai.models.openai import OpenAIModel
+    from pydantic_ai.providers.openai import OpenAIProvider
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.2)
+        return httpx.Response(
+            200,
+            json={
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "gpt-4o",
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": "ok"},
+                    }
+                ],
+            },
+        )
+
+    openai = AsyncOpenAI(
+        api_key="fake",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    agent = Agent(OpenAIModel("gpt-4o", provider=OpenAIProvider(openai_client=openai)))
+
+    async def extract(path: Path, load) -> None:
+        data = load(path)
+        await agent.run([BinaryContent(data=data, media_type="application/pdf")])
+        # the agent is done with the request, keep the PDF alive as a real run would
+        await asyncio.sleep(0.1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes_mb:
+            paths = [Path(tmp) / f"{size}-{i}.pdf" for i in range(concurrency)]
+            for path in paths:
+                path.write_bytes(os.urandom(size * 1024 * 1024))
+            for name, load in (("read_bytes", Path.read_bytes), ("map_file", map_file)):
+                tracemalloc.start()
+                await asyncio.gather(*(extract(path, load) for path in paths))
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                print(
+                    f"{size:>3}MB x {concurrency} {name:<10}: "
+                    f"peak {peak / 2**20:7.1f}MB, "
+                    f"{peak / 2**20 / concurrency:6.1f}MB per extraction"
+                )
+    await openai.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        asyncio.run(benchmark_memory())
+    else:
+        print("Usage: python -m pydantic_ai_examples.pdf bench", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,208 @@
+"""Keep static system prompts at the start of every request so providers can cache them.
+
+OpenAI (and other providers) cache the longest previously seen prefix of a prompt,
+once it's at least 1024 tokens, which cuts both the cost of those input tokens and
+the time to first token. The prefix has to be identical though: a system prompt
+which changes on every run, such as one naming the customer, breaks the cache for
+everything after it.
+
+`PrefixCachedModel` moves the system prompts marked as static to the front of each
+request, ahead of any per-run prompts, and records the number of cached prompt
+tokens in the run's usage under `cached_tokens`.
+
+Compare cached and uncached runs against a local stub model with:
+
+    uv run -m pydantic_ai_examples.prompt_cache
+"""
+
+from __future__ import annotations as _annotations
+
+import asyncio
+import dataclasses
+import os
+import time
+from collections.abc import AsyncIterator, Iterable
+from contextlib import asynccontextmanager
+
+import logfire
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelRequestPart,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    UserPromptPart,
+)
+from pydantic_ai.models import (
+    KnownModelName,
+    Model,
+    ModelRequestParameters,
+    StreamedResponse,
+)
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.settings import ModelSettings
+from pydantic_ai.usage import Usage
+
+from .embeddings import estimate_tokens
+
+
+@dataclasses.dataclass(init=False)
+class PrefixCachedModel(WrapperModel):
+    """Model which sends static system prompts before any other part of a request.
+
+    Args:
+        wrapped: Model to send the requests to
+        static_prompts: System prompts which are the same on every run
+    """
+
+    static_prompts: frozenset[str]
+
+    def __init__(self, wrapped: Model | KnownModelName, static_prompts: Iterable[str]):
+        super().__init__(wrapped)
+        self.static_prompts = frozenset(static_prompts)
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> tuple[ModelResponse, Usage]:
+        response, usage = await self.wrapped.request(
+            self.static_first(messages), model_settings, model_request_parameters
+        )
+        details = usage.details = usage.details or {}
+        details.setdefault("cached_tokens", 0)
+        logfire.info(
+            "{cached_tokens} of {request_tokens} prompt tokens cached",
+            cached_tokens=details["cached_tokens"],
+            request_tokens=usage.request_tokens,
+        )
+        return response, usage
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> AsyncIterator[StreamedResponse]:
+        async with self.wrapped.request_stream(
+            self.static_first(messages), model_settings, model_request_parameters
+        ) as response_stream:
+            yield response_stream
+
+    def static_first(self, messages: list[ModelMessage]) -> list[ModelMessage]:
+        """Copy of `messages` with the static system prompts moved to the front.
+
+        The order is otherwise unchanged, and `messages` isn't modified since it's
+        the agent's message history.
+        """
+        if not messages or not isinstance(messages[0], ModelRequest):
+            return messages
+        first = messages[0]
+        static = [part for part in first.parts if self._is_static(part)]
+        if not static or all(map(self._is_static, first.parts[: len(static)])):
+            return messages
+        rest = [part for part in first.parts if not self._is_static(part)]
+        return [dataclasses.replace(first, parts=static + rest), *messages[1:]]
+
+    def _is_static(self, part: ModelRequestPart) -> bool:
+        # dynamic prompts are re-evaluated on every run, even if the text matches
+        return (
+            isinstance(part, SystemPromptPart)
+            and part.dynamic_ref is None
+            and part.content in self.static_prompts
+        )
+
+
+@dataclasses.dataclass
+class StubPrefixCacheModel(Model):
+    """Stub model with a provider-style prompt cache, for the benchmark.
+
+    Prompts are cached in 128 token increments of their longest prefix shared with
+    an earlier prompt, once that's at least 1024 tokens. Time to first token grows
+    with the number of uncached prompt tokens.
+    """
+
+    seconds_per_token: float = 2e-6
+    seen: list[str] = dataclasses.field(default_factory=list)
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> tuple[ModelResponse, Usage]:
+        prompt = "".join(
+            part.content
+            for message in messages
+            if isinstance(message, ModelRequest)
+            for part in message.parts
+            if isinstance(part, (SystemPromptPart, UserPromptPart))
+            and isinstance(part.content, str)
+        )
+        tokens = estimate_tokens(prompt)
+        shared = max(
+            (
+                estimate_tokens(os.path.commonprefix([prompt, seen]))
+                for seen in self.seen
+            ),
+            default=0,
+        )
+        cached = shared // 128 * 128 if shared >= 1024 else 0
+        self.seen.append(prompt)
+        await asyncio.sleep((tokens - cached) * self.seconds_per_token)
+        return ModelResponse(parts=[TextPart("ok")], model_name=self.model_name), Usage(
+            requests=1,
+            request_tokens=tokens,
+            response_tokens=1,
+            total_tokens=tokens + 1,
+            details={"cached_tokens": cached},
+        )
+
+    @property
+    def model_name(self) -> str:
+        return "stub-prefix-cache"
+
+    @property
+    def system(self) -> str:
+        return "stub"
+
+
+async def benchmark(runs: int = 20) -> None:
+    """Runs an agent whose per-run prompt is registered before its static one."""
+    from pydantic_ai import Agent
+
+    instructions = "Follow the marking scheme exactly. " * 800  # ~7000 tokens
+
+    for name, model in (
+        ("uncached", StubPrefixCacheModel()),
+        ("static first", PrefixCachedModel(StubPrefixCacheModel(), [instructions])),
+    ):
+        agent = Agent(model, deps_type=int)
+
+        @agent.system_prompt
+        def paper(ctx) -> str:
+            return f"You are marking paper {ctx.deps}."
+
+        @agent.system_prompt
+        def marking_instructions() -> str:
+            return instructions
+
+        usage = Usage()
+        start = time.perf_counter()
+        for i in range(runs):
+            result = await agent.run("Mark this answer.", deps=i)
+            usage.incr(result.usage())
+        elapsed = time.perf_counter() - start
+        cached = (usage.details or {}).get("cached_tokens", 0)
+        print(
+            f"{name:<12}: {elapsed / runs * 1000:6.2f}ms per run, "
+            f"{cached / (usage.request_tokens or 1):4.0%} of "
+            f"{usage.request_tokens} prompt tokens cached"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(benchmark())
@@ -1,27 +1,84 @@
+from __future__ import annotations
+
 import asyncio
+from collections import OrderedDict
 from dataclasses import dataclass
-from pathlib import Path
 import sys
-from typing import Union
+import time
+from typing import TYPE_CHECKING, Union
 
 import logfire
-from openai import AsyncOpenAI
+from pydantic import ValidationError
 from pydantic_ai import Agent, BinaryContent, RunContext
-from pymilvus import MilvusClient
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-from tqdm import tqdm
+from pydantic_ai.exceptions import UnexpectedModelBehavior
+from sqlalchemy import insert, select, text, update
 
 from . import model, schema
+from .embedding_cache import cached_embedding
+from .embeddings import BatchEmbedder
+from .http_pool import shared_model
+from .pdf import map_file, merge_questions, page_windows
+from .prompt_cache import PrefixCachedModel
+from .resources import get_openai, resources
+from .response_cache import with_response_cache
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from pymilvus import MilvusClient
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
 
-logfire.configure(send_to_logfire="if-token-present")
-openai = AsyncOpenAI()
-milvus_client = MilvusClient(uri="./milvus_demo.db")
 COLLECTION_NAME = "my_rag_collection"  # Constant name in uppercase
+MILVUS_INSERT_CHUNK = 500
+DATABASE_URL = "postgresql+asyncpg://postgres:@localhost:5432/exam_db"
+EXTRACT_MODEL = "openai:gpt-4o"
+RETRIEVAL_MODEL = "openai:gpt-4o"
+
+
+def _create_milvus() -> MilvusClient:
+    from pymilvus import MilvusClient
+
+    return MilvusClient(uri="./milvus_demo.db")
+
+
+def _create_engine() -> AsyncEngine:
+    """Create the async SQLAlchemy engine.
+
+    The engine keeps a pool of connections so concurrent agent runs overlap their
+    database I/O instead of blocking the event loop.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    return create_async_engine(
+        DATABASE_URL,
+        pool_size=10,
+        max_overflow=10,
+        pool_timeout=30,
+        pool_recycle=1800,
+        pool_pre_ping=True,
+    )
 
-# Create SQLAlchemy engine and sessionx
-engine = create_engine("postgresql://postgres:@localhost:5432/exam_db")
-Session = sessionmaker(bind=engine)
+
+get_milvus = resources.register("milvus", _create_milvus, close=lambda c: c.close())
+# re-extracting the same document is common, extraction responses can be cached
+get_extract_model = resources.register(
+    "extract_model",
+    lambda: with_response_cache(
+        PrefixCachedModel(shared_model(EXTRACT_MODEL), [EXTRACT_SYSTEM_PROMPT])
+    ),
+)
+get_retrieval_model = resources.register(
+    "retrieval_model",
+    lambda: PrefixCachedModel(shared_model(RETRIEVAL_MODEL), [RETRIEVAL_SYSTEM_PROMPT]),
+)
+get_engine = resources.register(
+    "exam_db_engine", _create_engine, close=lambda e: e.dispose()
+)
+
+
+def get_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    return async_sessionmaker(get_engine(), expire_on_commit=False)
 
 
 @dataclass
@@ -29,15 +86,10 @@ class Deps:
     """Dependencies container for agents."""
 
     openai: AsyncOpenAI
+    sessionmaker: async_sessionmaker[AsyncSession]
 
 
-extract_agent = Agent[BinaryContent, Union[model.Questions, model.Failed]](
-    model="openai:gpt-4o",  # Using latest stable model
-    deps_type=Deps,
-    instrument=True,
-    output_type=Union[model.Questions, model.Failed],
-    system_prompt=(
-        """You are an expert at extracting questions from documents.
+EXTRACT_SYSTEM_PROMPT = """You are an expert at extracting questions from documents.
         Your task is to read through documents and identify any questions that are asked.
         Extract both explicit questions (ending with ?) and implicit questions that are phrased as statements.
 
@@ -51,16 +103,8 @@ extract_agent = Agent[BinaryContent, Union[model.Questions, model.Failed]](
         7. When parts of a question reference each other or build on previous parts, keep them grouped as a single unit
 
         Return the questions structured according to the provided model schema."""
-    ),
-)
 
-retrieval_agent = Agent[str, model.RetrievedQuestions](
-    model="openai:gpt-4o",  # Using latest stable model
-    deps_type=Deps,
-    instrument=True,
-    output_type=model.RetrievedQuestions,
-    system_prompt=(
-        """
+RETRIEVAL_SYSTEM_PROMPT = """
         You are an intelligent assistant helping to refine or relay user queries based on retrieved information. You will be given a list of relevant questions retrieved from a vector database.
         Your task is:
         - To decide whether the retrieved questions need to be rephrased, or modified for clarity, context, or improved relevance.
@@ -69,7 +113,25 @@ retrieval_agent = Agent[str, model.RetrievedQuestions](
         - When possible, group related questions together in your response
         - Highlight questions that have marks allocated
         """
-    ),
+
+extract_agent = Agent[BinaryContent, Union[model.Questions, model.Failed]](
+    model=EXTRACT_MODEL,  # Using latest stable model
+    # don't create the OpenAI client until the first run
+    defer_model_check=True,
+    deps_type=Deps,
+    instrument=True,
+    output_type=Union[model.Questions, model.Failed],
+    system_prompt=EXTRACT_SYSTEM_PROMPT,
+)
+
+retrieval_agent = Agent[str, model.RetrievedQuestions](
+    model=RETRIEVAL_MODEL,  # Using latest stable model
+    # don't create the OpenAI client until the first run
+    defer_model_check=True,
+    deps_type=Deps,
+    instrument=True,
+    output_type=model.RetrievedQuestions,
+    system_prompt=RETRIEVAL_SYSTEM_PROMPT,
 )
 
 
@@ -86,30 +148,30 @@ async def retrieve(
     Returns:
         model.RetrievedQuestions: Retrieved questions
     """
-    session = Session()
-    try:
-        res = await search_milvus(
+    async with context.deps.sessionmaker() as session:
+        return await search_milvus(
             search_query, context.deps.openai, COLLECTION_NAME, session
         )
-        return res
-    finally:
-        session.close()
 
 
-def get_pdf_bytes(file_name: str) -> bytes:
-    """Read and return binary content of a PDF file.
+def get_pdf_bytes(file_name: str) -> memoryview:
+    """Memory-map the binary content of a PDF file.
+
+    The file isn't copied into memory, see `pdf.map_file`. pydantic can't serialize
+    the returned `memoryview`, so messages holding it can't be dumped, e.g. with
+    `result.all_messages_json()`, until they're passed through `pdf.persistable`.
 
     Args:
         file_name: Path to the PDF file
 
     Returns:
-        bytes: Binary content of the PDF file
+        memoryview: Binary content of the PDF file
 
     Raises:
         ValueError: If file cannot be read or is not found
     """
     try:
-        return Path(file_name).read_bytes()
+        return map_file(file_name)
     except Exception as e:
         raise ValueError(f"Failed to read PDF file {file_name}: {str(e)}")
 
@@ -117,6 +179,8 @@ def get_pdf_bytes(file_name: str) -> bytes:
 async def create_embedding(question: str, openai: AsyncOpenAI) -> list[float]:
     """Generate embeddings for a question using OpenAI's API.
 
+    Repeated questions are served from the shared embedding cache.
+
     Args:
         question: The question text to embed
         openai: AsyncOpenAI client instance
@@ -127,128 +191,451 @@ async def create_embedding(question: str, openai: AsyncOpenAI) -> list[float]:
     Raises:
         AssertionError: If unexpected number of embeddings returned
     """
-    embedding = await openai.embeddings.create(
-        input=question,
-        model="text-embedding-3-small",
-    )
-    assert len(embedding.data) == 1, (
-        f"Expected 1 embedding, got {len(embedding.data)}, question: {question}"
-    )
-    return embedding.data[0].embedding
+    return await cached_embedding(openai, question)
 
 
 async def load_data_into_milvus(
-    questions: list[model.ExamQuestion], openai: AsyncOpenAI, postgres_session
+    questions: list[model.ExamQuestion],
+    openai: AsyncOpenAI,
+    postgres_session: AsyncSession,
+    exam_name: str = "KCSE",
+    subject: str = "CRE",
+    year: str = "2024",
+    replace: bool = False,
 ) -> None:
     """Load question embeddings into Milvus vector database.
 
+    Parts are keyed on (exam_name, subject, year, question_number, part_label),
+    only parts which are new, whose content changed, or which are missing from
+    Milvus are embedded. Postgres rows for new parts are inserted with a single
+    statement and committed, then parts are embedded in batched, concurrent requests
+    and upserted into Milvus in chunks, so the collection stays searchable while a
+    paper is ingested.
+
     Args:
         questions: List of question texts to embed
         openai: AsyncOpenAI client instance
+        exam_name: Name of the exam the questions come from
+        subject: Subject of the paper
+        year: Year the paper was sat
+        replace: Drop and rebuild the whole collection instead of upserting
     """
-    if milvus_client.has_collection(COLLECTION_NAME):
-        milvus_client.drop_collection(COLLECTION_NAME)
-
-    milvus_client.create_collection(
-        collection_name=COLLECTION_NAME,
-        dimension=1536,  # text-embedding-3-small has 1536 dimensions
-        metric_type="IP",  # Inner product distance
-        consistency_level="Strong",  # Strong consistency level
-    )
+    # the Milvus client is synchronous, keep its calls off the event loop
+    milvus_client = get_milvus()
+    if replace and await asyncio.to_thread(
+        milvus_client.has_collection, COLLECTION_NAME
+    ):
+        await asyncio.to_thread(milvus_client.drop_collection, COLLECTION_NAME)
+
+    if not await asyncio.to_thread(milvus_client.has_collection, COLLECTION_NAME):
+        await asyncio.to_thread(
+            milvus_client.create_collection,
+            collection_name=COLLECTION_NAME,
+            dimension=1536,  # text-embedding-3-small has 1536 dimensions
+            metric_type="IP",  # Inner product distance
+            consistency_level="Strong",  # Strong consistency level
+        )
 
-    data = []
-    for question in tqdm(questions, desc="Creating embeddings"):
-        question_parts = question.parts
-        for part in question_parts:
-            # save to postgres
-            db_question = schema.ExamQuestion(
-                exam_name="KCSE",
-                subject="CRE",
-                year="2024",
-                question_number=question.question_number,
-                part_label=part.part_label,
-                content=part.content,
-                marks=part.marks,
+    paper = {"exam_name": exam_name, "subject": subject, "year": year}
+    parts = {
+        (question.question_number, part.part_label): part
+        for question in questions
+        for part in question.parts
+    }
+    existing = {
+        (row.question_number, row.part_label): row
+        for row in await postgres_session.scalars(
+            select(schema.ExamQuestion).filter_by(**paper)
+        )
+    }
+
+    new_keys = [key for key in parts if key not in existing]
+    changed = [
+        {"id": row.id, "content": parts[key].content, "marks": parts[key].marks}
+        for key, row in existing.items()
+        if key in parts
+        and (row.content, row.marks) != (parts[key].content, parts[key].marks)
+    ]
+    ids = {key: row.id for key, row in existing.items() if key in parts}
+    if new_keys:
+        # one INSERT ... RETURNING for all new parts, ids come back in parameter order
+        new_ids = (
+            await postgres_session.execute(
+                insert(schema.ExamQuestion).returning(
+                    schema.ExamQuestion.id, sort_by_parameter_order=True
+                ),
+                [
+                    {
+                        **paper,
+                        "question_number": question_number,
+                        "part_label": part_label,
+                        "content": parts[question_number, part_label].content,
+                        "marks": parts[question_number, part_label].marks,
+                    }
+                    for question_number, part_label in new_keys
+                ],
             )
-            postgres_session.add(db_question)
-            postgres_session.flush()
-
-            data.append(
-                {
-                    "id": db_question.id,
-                    "vector": await create_embedding(part.content, openai),
-                    "question_number": question.question_number,
-                    "question_part": part.part_label,
-                    "question": part.content,
-                    "marks": part.marks,
-                }
+            .scalars()
+            .all()
+        )
+        ids.update(zip(new_keys, new_ids))
+    if changed:
+        await postgres_session.execute(update(schema.ExamQuestion), changed)
+        for row in changed:
+            _question_cache.pop(row["id"], None)
+
+    # parts whose row already existed unchanged only need embedding if Milvus lost them
+    stale = {*(ids[key] for key in new_keys), *(row["id"] for row in changed)}
+    unchanged = [id_ for id_ in ids.values() if id_ not in stale]
+    embedded = {
+        entity["id"]
+        for entity in (
+            await asyncio.to_thread(
+                milvus_client.get, COLLECTION_NAME, ids=unchanged, output_fields=["id"]
             )
+            if unchanged
+            else []
+        )
+    }
+    records = [
+        {
+            "id": ids[key],
+            "question_number": key[0],
+            "question_part": key[1],
+            "question": part.content,
+            "marks": part.marks,
+        }
+        for key, part in parts.items()
+        if ids[key] not in embedded
+    ]
+    logfire.info(
+        "{new} new parts, {changed} changed, {skipped} already embedded",
+        new=len(new_keys),
+        changed=len(changed),
+        skipped=len(embedded),
+    )
 
-    postgres_session.commit()
-    milvus_client.insert(collection_name=COLLECTION_NAME, data=data)
+    # commit before upserting, so Milvus never holds ids of rows which were rolled
+    # back, rows whose vectors are missing are embedded by the next load
+    await postgres_session.commit()
+
+    start = time.perf_counter()
+    loaded = 0
+    try:
+        async for batch, embeddings in BatchEmbedder(openai).embed_batches(
+            records, lambda record: record["question"]
+        ):
+            data = [
+                {**record, "vector": embedding}
+                for record, embedding in zip(batch, embeddings)
+            ]
+            for i in range(0, len(data), MILVUS_INSERT_CHUNK):
+                await asyncio.to_thread(
+                    milvus_client.upsert,
+                    collection_name=COLLECTION_NAME,
+                    data=data[i : i + MILVUS_INSERT_CHUNK],
+                )
+            loaded += len(data)
+            logfire.info(
+                "Loaded {loaded}/{total} question parts, {rate:.1f} parts/s",
+                loaded=loaded,
+                total=len(records),
+                rate=loaded / (time.perf_counter() - start),
+            )
+    except Exception:
+        # changed parts may still have their old vectors, which would look embedded
+        if changed:
+            await asyncio.to_thread(
+                milvus_client.delete,
+                COLLECTION_NAME,
+                ids=[row["id"] for row in changed],
+            )
+        raise
 
 
 async def search_milvus(
     question: str,
     openai: AsyncOpenAI,
     collection_name: str,
-    postgres_session,
+    postgres_session: AsyncSession,
 ) -> list[model.RetrievedQuestion]:
     """Search for similar questions in Milvus database.
 
+    Questions are built straight from the search hits, in ranking order and with
+    their scores; Postgres is only queried for hits missing the question fields.
+
     Args:
         question: Query string to search for
         openai: AsyncOpenAI client instance
         collection_name: Name of Milvus collection to search
+        postgres_session: Session used for hits missing the question fields
 
     Returns:
-        list[model.RetrievedQuestion]: List of retrieved questions
+        list[model.RetrievedQuestion]: List of retrieved questions, best match first
     """
-    search_res = milvus_client.search(
+    embedding = await create_embedding(question, openai)
+    milvus_client = get_milvus()
+    search_res = await asyncio.to_thread(
+        milvus_client.search,
         collection_name=collection_name,
-        data=[await create_embedding(question, openai)],
+        data=[embedding],
         limit=5,
         search_params={"metric_type": "IP", "params": {}},
         output_fields=["question_number", "question_part", "question", "marks"],
     )
-    ids = [hit["id"] for hit in search_res[0]]
-    db_questions = (
-        postgres_session.query(schema.ExamQuestion)
-        .filter(schema.ExamQuestion.id.in_(ids))
-        .all()
+    hits = search_res[0]
+    # rows loaded before the text was stored in Milvus only have an id and vector
+    fallback = await lookup_questions(
+        postgres_session,
+        [hit["id"] for hit in hits if not REQUIRED_FIELDS <= hit["entity"].keys()],
     )
-    return [
-        model.RetrievedQuestion(
-            id=db_question.id,
-            question_number=db_question.question_number,
-            question_part=db_question.part_label,
-            question=db_question.content,
-            marks=db_question.marks,
-        )
-        for db_question in db_questions
-    ]
+    questions = []
+    for hit in hits:
+        entity = hit["entity"]
+        if hit["id"] in fallback:
+            question = fallback[hit["id"]].model_copy()
+        elif REQUIRED_FIELDS <= entity.keys():
+            question = model.RetrievedQuestion(
+                id=hit["id"],
+                question_number=entity["question_number"],
+                question_part=entity.get("question_part"),
+                question=entity["question"],
+                marks=entity.get("marks"),
+            )
+        else:
+            # the row was deleted from Postgres but is still in the collection
+            continue
+        question.score = hit["distance"]
+        questions.append(question)
+    return questions
+
+
+REQUIRED_FIELDS = {"question_number", "question"}
+QUESTION_CACHE_SIZE = 4096
+_question_cache: OrderedDict[int, model.RetrievedQuestion] = OrderedDict()
 
 
-async def extract_questions(path: str) -> None:
+async def lookup_questions(
+    postgres_session: AsyncSession, ids: list[int]
+) -> dict[int, model.RetrievedQuestion]:
+    """Fetch questions by id from Postgres, through a small in-process LRU cache.
+
+    Args:
+        postgres_session: Session to query when a question isn't cached
+        ids: Ids of the questions to fetch
+
+    Returns:
+        dict[int, model.RetrievedQuestion]: The questions found, by id
+    """
+    missing = [id_ for id_ in ids if id_ not in _question_cache]
+    if missing:
+        for db_question in await postgres_session.scalars(
+            select(schema.ExamQuestion).where(schema.ExamQuestion.id.in_(missing))
+        ):
+            _question_cache[db_question.id] = model.RetrievedQuestion(
+                id=db_question.id,
+                question_number=db_question.question_number,
+                question_part=db_question.part_label,
+                question=db_question.content,
+                marks=db_question.marks,
+            )
+    found = {}
+    for id_ in ids:
+        if id_ in _question_cache:
+            _question_cache.move_to_end(id_)
+            found[id_] = _question_cache[id_]
+    while len(_question_cache) > QUESTION_CACHE_SIZE:
+        _question_cache.popitem(last=False)
+    return found
+
+
+async def extract_questions(
+    path: str, chunked: bool = False, streaming: bool = False
+) -> None:
     """Extract questions from a PDF document using an LLM agent.
 
     Args:
         path: Path to the PDF document to analyze
+        chunked: Extract from overlapping page windows concurrently, see
+            `extract_questions_chunked`
+        streaming: Load questions while the model is still generating, see
+            `extract_questions_streaming`
     """
-    logfire.instrument_openai(openai)
+    if chunked and streaming:
+        raise ValueError("chunked and streaming extraction can't be combined")
     logfire.info("Extracting questions from {path}", path=path)
 
+    openai = get_openai()
+
+    sessionmaker = get_sessionmaker()
+    deps = Deps(openai=openai, sessionmaker=sessionmaker)
+    if streaming:
+        await extract_questions_streaming(get_pdf_bytes(path), deps)
+        return
+    output = await extract_from_pdf(get_pdf_bytes(path), deps, chunked=chunked)
+    if isinstance(output, model.Questions):
+        async with sessionmaker() as session:
+            await load_data_into_milvus(output.questions, openai, session)
+
+
+async def extract_from_pdf(
+    data: bytes | memoryview, deps: Deps, chunked: bool = False
+) -> Union[model.Questions, model.Failed]:
+    """Run the extraction agent over a PDF without loading the questions.
+
+    Args:
+        data: Binary content of the PDF
+        deps: Dependencies for `extract_agent`
+        chunked: Extract from overlapping page windows concurrently
+
+    Returns:
+        Union[model.Questions, model.Failed]: The extracted questions
+    """
+    if chunked:
+        return await extract_questions_chunked(data, deps)
     result = await extract_agent.run(
-        [BinaryContent(data=get_pdf_bytes(path), media_type="application/pdf")],
-        deps=Deps(openai=openai),
+        [BinaryContent(data=data, media_type="application/pdf")],
+        deps=deps,
+        model=get_extract_model(),
     )
+    return result.output
 
-    if isinstance(result.output, model.Questions):
-        session = Session()
+
+PAGE_WINDOW = 4
+PAGE_OVERLAP = 1
+MAX_CONCURRENT_WINDOWS = 8
+
+
+async def extract_questions_chunked(
+    data: bytes | memoryview,
+    deps: Deps,
+    window: int = PAGE_WINDOW,
+    overlap: int = PAGE_OVERLAP,
+    max_concurrency: int = MAX_CONCURRENT_WINDOWS,
+) -> Union[model.Questions, model.Failed]:
+    """Extract questions from overlapping page windows of a PDF concurrently.
+
+    Each window is a small request, so large papers stay within the model's
+    context and latency is bounded by the slowest window rather than the page
+    count. Questions cut by a window boundary are merged back together.
+
+    Args:
+        data: Binary content of the PDF
+        deps: Dependencies for `extract_agent`
+        window: Number of pages per window
+        overlap: Number of pages shared by consecutive windows
+        max_concurrency: Maximum number of windows extracted at once
+
+    Returns:
+        Union[model.Questions, model.Failed]: Merged questions, or `Failed` if no
+        window contained any
+    """
+    windows = await page_windows(data, window, overlap)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def extract(index: int, pdf: bytes) -> Union[model.Questions, model.Failed]:
+        async with semaphore:
+            with logfire.span(
+                "extract window {index}/{count}", index=index + 1, count=len(windows)
+            ):
+                result = await extract_agent.run(
+                    [BinaryContent(data=pdf, media_type="application/pdf")],
+                    deps=deps,
+                    model=get_extract_model(),
+                )
+        return result.output
+
+    outputs = await asyncio.gather(
+        *(extract(index, pdf) for index, pdf in enumerate(windows))
+    )
+    found = [output for output in outputs if isinstance(output, model.Questions)]
+    return merge_questions(found) if found else model.Failed()
+
+
+STREAM_DEBOUNCE = 0.1
+
+
+async def extract_questions_streaming(
+    data: bytes | memoryview, deps: Deps, debounce_by: float | None = STREAM_DEBOUNCE
+) -> int:
+    """Extract questions from a PDF, loading each one as soon as it's complete.
+
+    The output is validated partially while the model streams it. A question is
+    complete once the model has started on the next one (or the stream has
+    ended), complete questions are queued and embedded and stored while the
+    rest of the paper is still being generated. `load_data_into_milvus` upserts,
+    so loading questions in several groups gives the same result as loading them
+    all at once.
+
+    Args:
+        data: Binary content of the PDF
+        deps: Dependencies for `extract_agent`
+        debounce_by: Seconds to group streamed chunks by before validating
+
+    Returns:
+        int: Number of questions loaded
+    """
+    queue: asyncio.Queue[model.ExamQuestion | None] = asyncio.Queue()
+
+    async def produce() -> None:
+        sent = 0
         try:
-            await load_data_into_milvus(result.output.questions, openai, session)
+            async with extract_agent.run_stream(
+                [BinaryContent(data=data, media_type="application/pdf")],
+                deps=deps,
+                model=get_extract_model(),
+            ) as result:
+                async for message, is_last in result.stream_structured(
+                    debounce_by=debounce_by
+                ):
+                    try:
+                        output = await result.validate_structured_output(
+                            message, allow_partial=not is_last
+                        )
+                    except (ValidationError, UnexpectedModelBehavior):
+                        # the output tool call may not have started yet
+                        if is_last:
+                            raise
+                        continue
+                    if not isinstance(output, model.Questions):
+                        continue
+                    # the last question may still be receiving parts
+                    complete = len(output.questions) - (0 if is_last else 1)
+                    for question in output.questions[sent:complete]:
+                        queue.put_nowait(question)
+                    sent = max(sent, complete)
         finally:
-            session.close()
+            queue.put_nowait(None)
+
+    async def consume() -> int:
+        loaded = 0
+        async with deps.sessionmaker() as session:
+            finished = False
+            while not finished:
+                # load everything queued since the last group in one go
+                questions = [await queue.get()]
+                while not queue.empty():
+                    questions.append(queue.get_nowait())
+                if questions[-1] is None:
+                    finished = True
+                    questions.pop()
+                if questions:
+                    with logfire.span(
+                        "load {count} streamed questions", count=len(questions)
+                    ):
+                        await load_data_into_milvus(questions, deps.openai, session)
+                    loaded += len(questions)
+        return loaded
+
+    consumer = asyncio.create_task(consume())
+    try:
+        await produce()
+    except BaseException:
+        consumer.cancel()
+        raise
+    loaded = await consumer
+    logfire.info("Loaded {count} streamed questions", count=loaded)
+    return loaded
 
 
 async def retrieve_questions(query: str) -> model.RetrievedQuestions:
@@ -260,47 +647,60 @@ async def retrieve_questions(query: str) -> model.RetrievedQuestions:
     Returns:
         model.RetrievedQuestions: Retrieved and processed questions
     """
-    result = await retrieval_agent.run(query, deps=Deps(openai=openai))
+    result = await retrieval_agent.run(
+        query,
+        deps=Deps(openai=get_openai(), sessionmaker=get_sessionmaker()),
+        model=get_retrieval_model(),
+    )
     print(result.output)
     return result.output
 
 
 async def add_tables_to_exam_db():
     """Add tables to the exam database."""
-    Session = sessionmaker(bind=engine)
-    session = Session()
-    session.execute(
-        text(
-            """
-            CREATE TABLE exam_questions (
-                id SERIAL PRIMARY KEY,
-                exam_name VARCHAR(255),
-                subject VARCHAR(255),
-                year VARCHAR(255),
-                question_number VARCHAR(255),
-                part_label VARCHAR(255),
-                content TEXT,
-                marks INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    async with get_engine().begin() as conn:
+        await conn.execute(
+            text(
+                """
+                CREATE TABLE exam_questions (
+                    id SERIAL PRIMARY KEY,
+                    exam_name VARCHAR(255),
+                    subject VARCHAR(255),
+                    year VARCHAR(255),
+                    question_number VARCHAR(255),
+                    part_label VARCHAR(255),
+                    content TEXT,
+                    marks INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+        )
+        await conn.execute(
+            text(
+                """
+                CREATE UNIQUE INDEX exam_questions_key ON exam_questions
+                (exam_name, subject, year, question_number, COALESCE(part_label, ''))
+                """
             )
-            """
         )
-    )
-    session.commit()
-    session.close()
 
 
 if __name__ == "__main__":
     action = sys.argv[1] if len(sys.argv) > 1 else None
     if action == "extract":
-        asyncio.run(extract_questions("cre.pdf"))
+        asyncio.run(resources.run(extract_questions("cre.pdf")))
+    elif action == "extract-chunked":
+        asyncio.run(resources.run(extract_questions("cre.pdf", chunked=True)))
+    elif action == "extract-streaming":
+        asyncio.run(resources.run(extract_questions("cre.pdf", streaming=True)))
     elif action == "retrieve":
-        asyncio.run(retrieve_questions("Outline six attributes of God"))
+        asyncio.run(resources.run(retrieve_questions("Outline six attributes of God")))
     elif action == "add_tables_to_exam_db":
-        asyncio.run(add_tables_to_exam_db())
+        asyncio.run(resources.run(add_tables_to_exam_db()))
     else:
         print(
-            "Usage: python question_extractor.py extract|retrieve",
+            "Usage: python question_extractor.py extract|extract-chunked|extract-streaming|retrieve",
             file=sys.stderr,
         )
         sys.exit(1)
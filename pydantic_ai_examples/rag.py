@@ -1,38 +1,54 @@
 from __future__ import annotations as _annotations
 
 import asyncio
+import hashlib
+import os
 import re
+import struct
 import sys
+import time
 import unicodedata
 from contextlib import asynccontextmanager
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
 import asyncpg
 import httpx
 import logfire
-import pydantic_core
-from openai import AsyncOpenAI
+import numpy as np
 from pydantic import TypeAdapter
 from typing_extensions import AsyncGenerator
 
 from pydantic_ai import RunContext
 from pydantic_ai.agent import Agent
 
-# 'if-token-present' means nothing will be sent (and the example will work) if you don't have logfire configured
-logfire.configure(send_to_logfire="if-token-present")
-logfire.instrument_asyncpg()
+from .embedding_cache import cached_embedding
+from .embeddings import BatchEmbedder
+from .resources import get_openai, resources
+from .retrieval import LocalIndex, PgVectorBackend, RetrievalBackend
+from .tools import memoize
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+@resources.on_startup
+def instrument_asyncpg() -> None:
+    logfire.instrument_asyncpg()
 
 
 @dataclass
 class Deps:
     openai: AsyncOpenAI
-    pool: asyncpg.Pool
+    backend: RetrievalBackend
 
 
-agent = Agent("openai:gpt-4o", deps_type=Deps, instrument=True)
+agent = Agent("openai:gpt-4o", deps_type=Deps, instrument=True, defer_model_check=True)
 
 
+# a process searches a single backend, so results only depend on the query
 @agent.tool
+@memoize(ttl=300)
 async def retrieve(context: RunContext[Deps], search_query: str) -> str:
     """Retrieve documentation sections based on a search query.
 
@@ -40,42 +56,46 @@ async def retrieve(context: RunContext[Deps], search_query: str) -> str:
         context: The call context.
         search_query: The search query.
     """
-    with logfire.span(
-        "create embedding for {search_query=}", search_query=search_query
-    ):
-        embedding = await context.deps.openai.embeddings.create(
-            input=search_query,
-            model="text-embedding-3-small",
-        )
-
-    assert len(embedding.data) == 1, (
-        f"Expected 1 embedding, got {len(embedding.data)}, doc query: {search_query!r}"
-    )
-    embedding = embedding.data[0].embedding
-    embedding_json = pydantic_core.to_json(embedding).decode()
-    rows = await context.deps.pool.fetch(
-        "SELECT url, title, content FROM doc_sections ORDER BY embedding <-> $1 LIMIT 8",
-        embedding_json,
-    )
+    embedding = await cached_embedding(context.deps.openai, search_query)
+    sections = await context.deps.backend.search(embedding, limit=8)
     return "\n\n".join(
-        f"# {row['title']}\nDocumentation URL:{row['url']}\n\n{row['content']}\n"
-        for row in rows
+        f"# {section.title}\nDocumentation URL:{section.url}\n\n{section.content}\n"
+        for section in sections
     )
 
 
 async def run_agent(question: str):
     """Entry point to run the agent and perform RAG based question answering."""
-    openai = AsyncOpenAI()
-    logfire.instrument_openai(openai)
-
+    openai = get_openai()
     logfire.info('Asking "{question}"', question=question)
 
-    async with database_connect(False) as pool:
-        deps = Deps(openai=openai, pool=pool)
+    async with retrieval_backend() as backend:
+        deps = Deps(openai=openai, backend=backend)
         answer = await agent.run(question, deps=deps)
     print(answer.output)
 
 
+@asynccontextmanager
+async def retrieval_backend() -> AsyncGenerator[RetrievalBackend, None]:
+    """The retrieval backend configured for this deployment.
+
+    `RAG_BACKEND` selects `pgvector` (the default) or `local`, which searches the
+    index in `RAG_LOCAL_INDEX` written by the `build-local` action; `RAG_LOCAL_MODE`
+    picks its `exact` or `ivf` search.
+    """
+    backend = os.environ.get("RAG_BACKEND", "pgvector")
+    if backend == "pgvector":
+        async with database_connect(False) as pool:
+            yield PgVectorBackend(pool)
+    elif backend == "local":
+        mode = os.environ.get("RAG_LOCAL_MODE", "exact")
+        if mode not in ("exact", "ivf"):
+            raise ValueError(f"Unknown RAG_LOCAL_MODE {mode!r}, expected exact|ivf")
+        yield LocalIndex(os.environ.get("RAG_LOCAL_INDEX", LOCAL_INDEX_PATH), mode=mode)
+    else:
+        raise ValueError(f"Unknown RAG_BACKEND {backend!r}, expected pgvector|local")
+
+
 #######################################################
 # The rest of this file is dedicated to preparing the #
 # search database, and some utilities.                #
@@ -97,8 +117,7 @@ async def build_search_db():
         response.raise_for_status()
     sections = sessions_ta.validate_json(response.content)
 
-    openai = AsyncOpenAI()
-    logfire.instrument_openai(openai)
+    openai = get_openai()
 
     async with database_connect(True) as pool:
         with logfire.span("create schema"):
@@ -106,42 +125,188 @@ async def build_search_db():
                 async with conn.transaction():
                     await conn.execute(DB_SCHEMA)
 
-        sem = asyncio.Semaphore(10)
-        async with asyncio.TaskGroup() as tg:
-            for section in sections:
-                tg.create_task(insert_doc_section(sem, openai, pool, section))
+        await sync_doc_sections(BatchEmbedder(openai), pool, sections)
+
 
+# rows per COPY, keeps each statement's buffer bounded for large batches
+COPY_CHUNK_ROWS = 5_000
 
-async def insert_doc_section(
-    sem: asyncio.Semaphore,
-    openai: AsyncOpenAI,
+
+async def sync_doc_sections(
+    embedder: BatchEmbedder,
     pool: asyncpg.Pool,
-    section: DocsSection,
+    sections: list[DocsSection],
 ) -> None:
-    async with sem:
-        url = section.url()
-        exists = await pool.fetchval("SELECT 1 FROM doc_sections WHERE url = $1", url)
-        if exists:
-            logfire.info("Skipping {url=}", url=url)
-            return
-
-        with logfire.span("create embedding for {url=}", url=url):
-            embedding = await openai.embeddings.create(
-                input=section.embedding_content(),
-                model="text-embedding-3-small",
-            )
-        assert len(embedding.data) == 1, (
-            f"Expected 1 embedding, got {len(embedding.data)}, doc section: {section}"
+    """Bring `doc_sections` in line with `sections`, embedding only what changed.
+
+    Each row records the hash of the content it was embedded from and the embedding
+    model used. The existing rows are loaded once and diffed in memory: new sections
+    and sections whose content or embedding model changed are embedded in
+    token-bounded batches and streamed in with `COPY`, rows for sections which no
+    longer exist are deleted.
+    """
+    existing = {
+        row["url"]: (row["content_hash"], row["embedding_model"])
+        for row in await pool.fetch(
+            "SELECT url, content_hash, embedding_model FROM doc_sections"
         )
-        embedding = embedding.data[0].embedding
-        embedding_json = pydantic_core.to_json(embedding).decode()
+    }
+    wanted: dict[str, DocsSection] = {}
+    for section in sections:
+        # COPY fails the whole chunk on a duplicate, keep the first section per URL
+        wanted.setdefault(section.url(), section)
+
+    removed = [url for url in existing if url not in wanted]
+    changed = [
+        section
+        for url, section in wanted.items()
+        if existing.get(url) != (section.content_hash(), embedder.model)
+    ]
+    logfire.info(
+        "{unchanged} sections unchanged, embedding {changed}, deleting {removed}",
+        unchanged=len(wanted) - len(changed),
+        changed=len(changed),
+        removed=len(removed),
+    )
+    if removed:
         await pool.execute(
-            "INSERT INTO doc_sections (url, title, content, embedding) VALUES ($1, $2, $3, $4)",
-            url,
-            section.title,
-            section.content,
-            embedding_json,
+            "DELETE FROM doc_sections WHERE url = ANY($1::text[])", removed
+        )
+    if not changed:
+        return
+
+    start = time.perf_counter()
+    inserted = 0
+    async with pool.acquire() as conn:
+        await conn.set_type_codec(
+            "vector",
+            schema="public",
+            encoder=encode_vector,
+            decoder=decode_vector,
+            format="binary",
         )
+        try:
+            async for batch, embeddings in embedder.embed_batches(
+                changed, DocsSection.embedding_content
+            ):
+                records = [
+                    (
+                        section.url(),
+                        section.title,
+                        section.content,
+                        section.content_hash(),
+                        embedder.model,
+                        embedding,
+                    )
+                    for section, embedding in zip(batch, embeddings)
+                ]
+                # replace stale rows in the same transaction so search never misses them
+                async with conn.transaction():
+                    await conn.execute(
+                        "DELETE FROM doc_sections WHERE url = ANY($1::text[])",
+                        [record[0] for record in records if record[0] in existing],
+                    )
+                    for i in range(0, len(records), COPY_CHUNK_ROWS):
+                        await conn.copy_records_to_table(
+                            "doc_sections",
+                            records=records[i : i + COPY_CHUNK_ROWS],
+                            columns=DOC_SECTION_COLUMNS,
+                        )
+                inserted += len(records)
+                logfire.info(
+                    "Inserted {inserted}/{total} sections, {rate:.0f} rows/s",
+                    inserted=inserted,
+                    total=len(changed),
+                    rate=inserted / (time.perf_counter() - start),
+                )
+        finally:
+            await conn.reset_type_codec("vector", schema="public")
+
+
+DOC_SECTION_COLUMNS = (
+    "url",
+    "title",
+    "content",
+    "content_hash",
+    "embedding_model",
+    "embedding",
+)
+
+
+def encode_vector(vector: list[float]) -> bytes:
+    """Encode a vector in pgvector's binary format: dimensions, unused, float4s."""
+    return struct.pack(f">HH{len(vector)}f", len(vector), 0, *vector)
+
+
+def decode_vector(data: bytes) -> list[float]:
+    dimensions, _ = struct.unpack_from(">HH", data)
+    return list(struct.unpack_from(f">{dimensions}f", data, 4))
+
+
+LOCAL_INDEX_PATH = "rag_index"
+
+
+async def build_local_index(path: str = LOCAL_INDEX_PATH) -> None:
+    """Export `doc_sections` from Postgres into a `LocalIndex` at `path`."""
+    async with database_connect(False) as pool:
+        async with pool.acquire() as conn:
+            await conn.set_type_codec(
+                "vector",
+                schema="public",
+                encoder=encode_vector,
+                decoder=decode_vector,
+                format="binary",
+            )
+            try:
+                rows = await conn.fetch(
+                    "SELECT url, title, content, embedding FROM doc_sections ORDER BY id"
+                )
+            finally:
+                await conn.reset_type_codec("vector", schema="public")
+    with logfire.span("build local index of {count} sections", count=len(rows)):
+        LocalIndex.build(path, (tuple(row) for row in rows))
+
+
+async def benchmark_backends(
+    path: str = LOCAL_INDEX_PATH, queries: int = 200, limit: int = 8
+) -> None:
+    """Compare latency and recall of the local index with the pgvector HNSW index.
+
+    Queries are stored embeddings with a little noise added, recall is measured
+    against the exact local search.
+    """
+    exact = LocalIndex(path, mode="exact")
+    ivf = LocalIndex(path, mode="ivf")
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(exact.sections), size=min(queries, len(exact.sections)))
+    query_vectors = [
+        (exact.vectors[row] + rng.normal(0, 0.01, exact.vectors.shape[1])).tolist()
+        for row in rows
+    ]
+    truth = [
+        {exact.sections[i].url for i in exact.search_ids(query, limit)}
+        for query in query_vectors
+    ]
+
+    async with database_connect(False) as pool:
+        backends: dict[str, RetrievalBackend] = {
+            "local exact": exact,
+            "local ivf": ivf,
+            "pgvector hnsw": PgVectorBackend(pool),
+        }
+        for name, backend in backends.items():
+            latencies: list[float] = []
+            hits = 0
+            for query, expected in zip(query_vectors, truth):
+                start = time.perf_counter()
+                sections = await backend.search(query, limit)
+                latencies.append(time.perf_counter() - start)
+                hits += len(expected & {section.url for section in sections})
+            print(
+                f"{name:>14}: p50 {np.percentile(latencies, 50) * 1000:.2f}ms "
+                f"p99 {np.percentile(latencies, 99) * 1000:.2f}ms "
+                f"recall@{limit} {hits / (len(truth) * limit):.3f}"
+            )
 
 
 @dataclass
@@ -162,6 +327,9 @@ class DocsSection:
     def embedding_content(self) -> str:
         return "\n\n".join((f"path: {self.path}", f"title: {self.title}", self.content))
 
+    def content_hash(self) -> str:
+        return hashlib.sha256(self.embedding_content().encode()).hexdigest()
+
 
 sessions_ta = TypeAdapter(list[DocsSection])
 
@@ -203,9 +371,15 @@ CREATE TABLE IF NOT EXISTS doc_sections (
     url text NOT NULL UNIQUE,
     title text NOT NULL,
     content text NOT NULL,
+    -- sha256 of the embedded content and the model it was embedded with, see `sync_doc_sections`
+    content_hash text NOT NULL,
+    embedding_model text NOT NULL,
     -- text-embedding-3-small returns a vector of 1536 floats
     embedding vector(1536) NOT NULL
 );
+-- tables created before content hashes were tracked get re-embedded on the next build
+ALTER TABLE doc_sections ADD COLUMN IF NOT EXISTS content_hash text NOT NULL DEFAULT '';
+ALTER TABLE doc_sections ADD COLUMN IF NOT EXISTS embedding_model text NOT NULL DEFAULT '';
 CREATE INDEX IF NOT EXISTS idx_doc_sections_embedding ON doc_sections USING hnsw (embedding vector_l2_ops);
 """
 
@@ -224,16 +398,20 @@ def slugify(value: str, separator: str, unicode: bool = False) -> str:
 if __name__ == "__main__":
     action = sys.argv[1] if len(sys.argv) > 1 else None
     if action == "build":
-        asyncio.run(build_search_db())
+        asyncio.run(resources.run(build_search_db()))
+    elif action == "build-local":
+        asyncio.run(resources.run(build_local_index()))
+    elif action == "bench":
+        asyncio.run(resources.run(benchmark_backends()))
     elif action == "search":
         if len(sys.argv) == 3:
             q = sys.argv[2]
         else:
             q = "How do I configure logfire to work with FastAPI?"
-        asyncio.run(run_agent(q))
+        asyncio.run(resources.run(run_agent(q)))
     else:
         print(
-            "uv run --extra examples -m pydantic_ai_examples.rag build|search",
+            "uv run --extra examples -m pydantic_ai_examples.rag build|build-local|bench|search",
             file=sys.stderr,
         )
         sys.exit(1)
@@ -0,0 +1,194 @@
+"""Lazily created clients and connections shared by the example modules.
+
+Importing an example module must not open connections or construct clients:
+each one registers a factory here and the object is only created the first time
+it's used. Entry points wrap their work in `resources.lifespan()` (or
+`resources.run(...)`) so startup hooks run first and everything created is
+closed on the way out.
+
+Check import cost against a budget with:
+
+    uv run -m pydantic_ai_examples.resources [budget_ms]
+"""
+
+from __future__ import annotations as _annotations
+
+import inspect
+import re
+import subprocess
+import sys
+import threading
+from collections.abc import AsyncIterator, Awaitable, Callable, Coroutine
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, Generic, TypeVar
+
+import logfire
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+T = TypeVar("T")
+R = TypeVar("R")
+Hook = Callable[[], "Awaitable[None] | None"]
+
+
+class Resource(Generic[T]):
+    """Handle to a registered resource, call it to get the (lazily created) object."""
+
+    def __init__(self, registry: Resources, name: str):
+        self.registry = registry
+        self.name = name
+
+    def __call__(self) -> T:
+        return self.registry.get(self.name)
+
+
+class Resources:
+    """Registry of lazily created resources with startup and shutdown hooks."""
+
+    def __init__(self):
+        self._factories: dict[str, Callable[[], Any]] = {}
+        self._closers: dict[str, Callable[[Any], Awaitable[None] | None]] = {}
+        self._instances: dict[str, Any] = {}
+        self._startup_hooks: list[Hook] = []
+        self._shutdown_hooks: list[Hook] = []
+        self._started = False
+        # re-entrant, factories may get other resources
+        self._lock = threading.RLock()
+
+    def register(
+        self,
+        name: str,
+        factory: Callable[[], T],
+        close: Callable[[T], Awaitable[None] | None] | None = None,
+    ) -> Resource[T]:
+        """Register `factory` to create the resource `name` on first use.
+
+        Args:
+            name: Unique name of the resource
+            factory: Creates the resource
+            close: Called with the resource on shutdown, may be async
+        """
+        if name in self._factories:
+            raise ValueError(f"Resource {name!r} is already registered")
+        self._factories[name] = factory
+        if close is not None:
+            self._closers[name] = close
+        return Resource(self, name)
+
+    def get(self, name: str) -> Any:
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._instances:
+                with logfire.span("create resource {name}", name=name):
+                    self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    def on_startup(self, hook: Hook) -> Hook:
+        self._startup_hooks.append(hook)
+        return hook
+
+    def on_shutdown(self, hook: Hook) -> Hook:
+        self._shutdown_hooks.append(hook)
+        return hook
+
+    async def startup(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        try:
+            for hook in self._startup_hooks:
+                await _call(hook)
+        except BaseException:
+            # let a later attempt run the hooks again
+            self._started = False
+            raise
+
+    async def shutdown(self) -> None:
+        """Close created resources, newest first, then run the shutdown hooks."""
+        with self._lock:
+            instances = list(self._instances.items())
+            self._instances.clear()
+        for name, instance in reversed(instances):
+            if close := self._closers.get(name):
+                await _call(close, instance)
+        for hook in self._shutdown_hooks:
+            await _call(hook)
+        self._started = False
+
+    @asynccontextmanager
+    async def lifespan(self) -> AsyncIterator[Resources]:
+        await self.startup()
+        try:
+            yield self
+        finally:
+            await self.shutdown()
+
+    async def run(self, coro: Coroutine[Any, Any, R]) -> R:
+        """Await `coro` inside `lifespan`, for use with `asyncio.run`."""
+        async with self.lifespan():
+            return await coro
+
+
+async def _call(func: Callable[..., Any], *args: Any) -> None:
+    result = func(*args)
+    if inspect.isawaitable(result):
+        await result
+
+
+resources = Resources()
+
+
+@resources.on_startup
+def configure_logfire() -> None:
+    # 'if-token-present' means nothing will be sent (and the example will work) if you don't have logfire configured
+    logfire.configure(send_to_logfire="if-token-present")
+
+
+def _create_openai() -> AsyncOpenAI:
+    from openai import AsyncOpenAI
+
+    from .http_pool import http_pools
+
+    # share connections with the agents' OpenAI models
+    client = AsyncOpenAI(http_client=http_pools.client("openai"))
+    logfire.instrument_openai(client)
+    return client
+
+
+get_openai = resources.register("openai", _create_openai, close=lambda c: c.close())
+
+EXAMPLE_MODULES = (
+    "pydantic_ai_examples.rag",
+    "pydantic_ai_examples.question_extractor",
+)
+
+
+def import_time_ms(module: str) -> float:
+    """Cumulative time to import `module` in a fresh interpreter, per `-X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    match = re.search(
+        rf"^import time:\s+\d+ \|\s+(\d+) \|\s*{re.escape(module)}$",
+        result.stderr,
+        re.MULTILINE,
+    )
+    assert match, f"{module} not found in -X importtime output"
+    return int(match.group(1)) / 1000
+
+
+if __name__ == "__main__":
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 500
+    over_budget = False
+    for module in EXAMPLE_MODULES:
+        elapsed = import_time_ms(module)
+        over_budget |= elapsed > budget
+        print(f"{module}: {elapsed:.0f}ms (budget {budget:.0f}ms)")
+    sys.exit(1 if over_budget else 0)
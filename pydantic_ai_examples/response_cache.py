@@ -0,0 +1,261 @@
+"""Opt-in cache of model responses, for agents which are re-run on identical inputs.
+
+`CachedModel` wraps any model. A request is keyed on everything which affects the
+response: the model, the messages (ignoring timestamps), the function and output
+tool definitions, which include the output schema, and the model settings. On a
+hit the stored response is returned without calling the model, so the agent still
+validates the output as usual, but in milliseconds and without using any tokens.
+
+Responses are stored in SQLite, expire after `ttl` seconds and the least recently
+used are evicted once the store grows past `max_bytes`. Set `$RESPONSE_CACHE_PATH`
+to the database file to enable the cache for the example agents.
+"""
+
+from __future__ import annotations as _annotations
+
+import dataclasses
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any
+
+import logfire
+from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter, ModelResponse
+from pydantic_ai.models import (
+    KnownModelName,
+    Model,
+    ModelRequestParameters,
+    StreamedResponse,
+    infer_model,
+)
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.settings import ModelSettings
+from pydantic_ai.usage import Usage
+
+from .resources import resources
+
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _canonical(value: Any) -> Any:
+    """JSON-able form of `value` which is equal for equivalent requests."""
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {
+            field.name: _canonical(getattr(value, field.name))
+            for field in dataclasses.fields(value)
+            # timestamps differ between otherwise identical runs
+            if field.name != "timestamp"
+        }
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        # documents can be large, their digest identifies them just as well
+        return hashlib.sha256(value).hexdigest()
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def request_key(
+    model: Model,
+    messages: list[ModelMessage],
+    model_settings: ModelSettings | None,
+    model_request_parameters: ModelRequestParameters,
+) -> str:
+    payload = json.dumps(
+        [
+            model.system,
+            model.model_name,
+            _canonical(messages),
+            _canonical(model_settings),
+            _canonical(model_request_parameters),
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """SQLite store of model responses with a TTL and a size bound.
+
+    Args:
+        path: SQLite database file, created if missing
+        ttl: Seconds a response is served for after it was stored
+        max_bytes: Total size of stored responses, least recently used are evicted
+            beyond this
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self.path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+        )
+
+    def get(self, key: str) -> ModelResponse | None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] + self.ttl < now:
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._db.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+        (response,) = ModelMessagesTypeAdapter.validate_json(row[0])
+        assert isinstance(response, ModelResponse)
+        return response
+
+    def put(self, key: str, response: ModelResponse) -> None:
+        data = ModelMessagesTypeAdapter.dump_json([response])
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                    (key, data, len(data), now, now),
+                )
+                self._evict(now)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT count(*), coalesce(sum(size), 0) FROM responses"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _evict(self, now: float) -> None:
+        """Drop expired responses, then the least recently used until under `max_bytes`.
+
+        Must be called inside a write transaction.
+        """
+        expired = self._db.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+        ).rowcount
+        (size,) = self._db.execute(
+            "SELECT coalesce(sum(size), 0) FROM responses"
+        ).fetchone()
+        evicted = 0
+        for key, entry_size in self._db.execute(
+            "SELECT key, size FROM responses ORDER BY last_used"
+        ).fetchall():
+            if size <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            size -= entry_size
+            evicted += 1
+        self.evictions += expired + evicted
+
+
+@dataclasses.dataclass(init=False)
+class CachedModel(WrapperModel):
+    """Model which serves repeated requests from a `ResponseCache`.
+
+    Streamed requests aren't cached, they're passed straight to the wrapped model.
+    """
+
+    cache: ResponseCache
+
+    def __init__(self, wrapped: Model | KnownModelName, cache: ResponseCache):
+        super().__init__(wrapped)
+        self.cache = cache
+
+    async def request(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> tuple[ModelResponse, Usage]:
+        key = request_key(
+            self.wrapped, messages, model_settings, model_request_parameters
+        )
+        response = self.cache.get(key)
+        if response is not None:
+            logfire.info("Response cache hit {key}", key=key)
+            # nothing was sent to the model, so no tokens were used
+            return response, Usage(details={"response_cache_hits": 1})
+
+        response, usage = await self.wrapped.request(
+            messages, model_settings, model_request_parameters
+        )
+        self.cache.put(key, response)
+        return response, usage
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: list[ModelMessage],
+        model_settings: ModelSettings | None,
+        model_request_parameters: ModelRequestParameters,
+    ) -> AsyncIterator[StreamedResponse]:
+        async with self.wrapped.request_stream(
+            messages, model_settings, model_request_parameters
+        ) as response_stream:
+            yield response_stream
+
+
+get_response_cache = resources.register(
+    "response_cache",
+    lambda: ResponseCache(os.environ["RESPONSE_CACHE_PATH"]),
+    close=lambda cache: cache.close(),
+)
+
+
+def with_response_cache(model: Model | KnownModelName) -> Model:
+    """`model`, wrapped in a `CachedModel` if `$RESPONSE_CACHE_PATH` is set."""
+    if os.environ.get("RESPONSE_CACHE_PATH"):
+        return CachedModel(model, get_response_cache())
+    return infer_model(model)
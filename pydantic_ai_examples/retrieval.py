@@ -0,0 +1,176 @@
+"""Retrieval backends for the RAG example.
+
+`PgVectorBackend` queries `doc_sections` in Postgres through its pgvector HNSW
+index. `LocalIndex` keeps the same sections in a directory on disk and searches
+them in-process with NumPy, either exactly or approximately with an IVF index,
+so small deployments and tests don't need Postgres.
+"""
+
+from __future__ import annotations as _annotations
+
+import json
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Literal, Protocol
+
+import asyncpg
+import numpy as np
+import pydantic_core
+
+SearchMode = Literal["exact", "ivf"]
+
+
+@dataclass
+class RetrievedSection:
+    url: str
+    title: str
+    content: str
+
+
+class RetrievalBackend(Protocol):
+    async def search(
+        self, embedding: list[float], limit: int
+    ) -> list[RetrievedSection]:
+        """Return the `limit` sections nearest to `embedding` by L2 distance."""
+        ...
+
+
+@dataclass
+class PgVectorBackend:
+    pool: asyncpg.Pool
+
+    async def search(
+        self, embedding: list[float], limit: int
+    ) -> list[RetrievedSection]:
+        rows = await self.pool.fetch(
+            "SELECT url, title, content FROM doc_sections ORDER BY embedding <-> $1 LIMIT $2",
+            pydantic_core.to_json(embedding).decode(),
+            limit,
+        )
+        return [
+            RetrievedSection(row["url"], row["title"], row["content"]) for row in rows
+        ]
+
+
+class LocalIndex:
+    """Sections and their embeddings stored in a directory, searched with NumPy.
+
+    `vectors.npy` holds the float32 embedding matrix and is memory-mapped, so only
+    the pages touched by a search are read. `ivf.npz` partitions the rows around
+    k-means centroids; in `ivf` mode a search only scans the `nprobe` partitions
+    nearest the query.
+
+    Args:
+        path: Directory written by `LocalIndex.build`
+        mode: `exact` for a brute-force scan, `ivf` for the approximate search
+        nprobe: Number of IVF partitions scanned per query
+    """
+
+    def __init__(self, path: str | Path, mode: SearchMode = "exact", nprobe: int = 8):
+        if mode not in ("exact", "ivf"):
+            raise ValueError(f"Unknown search mode {mode!r}, expected exact|ivf")
+        self.path = Path(path)
+        self.mode = mode
+        self.nprobe = nprobe
+        self.vectors = np.load(self.path / "vectors.npy", mmap_mode="r")
+        self.norms = np.load(self.path / "norms.npy")
+        self.sections = [
+            RetrievedSection(**section)
+            for section in json.loads((self.path / "sections.json").read_bytes())
+        ]
+        if mode == "ivf":
+            ivf = np.load(self.path / "ivf.npz")
+            self.centroids = ivf["centroids"]
+            self.centroid_norms = (self.centroids**2).sum(axis=1)
+            self.order = ivf["order"]
+            self.offsets = ivf["offsets"]
+
+    @classmethod
+    def build(
+        cls,
+        path: str | Path,
+        rows: Iterable[tuple[str, str, str, list[float]]],
+        ivf_lists: int | None = None,
+    ) -> None:
+        """Write an index of `(url, title, content, embedding)` rows to `path`.
+
+        Args:
+            path: Directory to write to, created if missing
+            rows: Sections and their embeddings
+            ivf_lists: Number of IVF partitions, defaults to about the square root
+                of the number of rows
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        sections: list[dict[str, str]] = []
+        vectors: list[list[float]] = []
+        for url, title, content, embedding in rows:
+            sections.append({"url": url, "title": title, "content": content})
+            vectors.append(embedding)
+
+        if not vectors:
+            raise ValueError("Can't build an index without any rows")
+        matrix = np.asarray(vectors, dtype=np.float32)
+        np.save(path / "vectors.npy", matrix)
+        np.save(path / "norms.npy", (matrix**2).sum(axis=1))
+        (path / "sections.json").write_bytes(pydantic_core.to_json(sections))
+
+        lists = min(ivf_lists or max(1, int(np.sqrt(len(matrix)))), len(matrix))
+        centroids = _kmeans(matrix, lists)
+        assignments = _nearest(matrix, centroids)
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.searchsorted(assignments[order], np.arange(lists + 1))
+        np.savez(path / "ivf.npz", centroids=centroids, order=order, offsets=offsets)
+
+    async def search(
+        self, embedding: list[float], limit: int
+    ) -> list[RetrievedSection]:
+        return [self.sections[i] for i in self.search_ids(embedding, limit)]
+
+    def search_ids(self, embedding: list[float], limit: int) -> np.ndarray:
+        """Row numbers of the `limit` nearest rows, nearest first."""
+        query = np.asarray(embedding, dtype=np.float32)
+        if self.mode == "exact":
+            # |x - q|^2 = |x|^2 - 2 x.q + |q|^2, the last term doesn't affect the order
+            distances = self.norms - 2 * (self.vectors @ query)
+            return _top_k(distances, limit)
+
+        probes = _top_k(self.centroid_norms - 2 * (self.centroids @ query), self.nprobe)
+        candidates = np.concatenate(
+            [self.order[self.offsets[p] : self.offsets[p + 1]] for p in probes]
+        )
+        distances = self.norms[candidates] - 2 * (self.vectors[candidates] @ query)
+        return candidates[_top_k(distances, limit)]
+
+
+def _top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    if k >= len(distances):
+        return np.argsort(distances)
+    top = np.argpartition(distances, k)[:k]
+    return top[np.argsort(distances[top])]
+
+
+def _nearest(x: np.ndarray, centroids: np.ndarray, chunk: int = 4096) -> np.ndarray:
+    """Index of the nearest centroid for each row of `x`, in bounded-memory chunks."""
+    centroid_norms = (centroids**2).sum(axis=1)
+    return np.concatenate(
+        [
+            np.argmin(centroid_norms - 2 * (x[i : i + chunk] @ centroids.T), axis=1)
+            for i in range(0, len(x), chunk)
+        ]
+    )
+
+
+def _kmeans(x: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means on a sample of `x`, good enough for a coarse quantizer."""
+    rng = np.random.default_rng(seed)
+    sample = x[rng.choice(len(x), size=min(len(x), k * 256), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest(sample, centroids)
+        for j in range(k):
+            members = sample[assignments == j]
+            if len(members):
+                centroids[j] = members.mean(axis=0)
+    return centroids
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, func
+from sqlalchemy import Column, Index, Integer, String, Text, TIMESTAMP, func
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -10,9 +10,22 @@ class ExamQuestion(Base):
     id = Column(Integer, primary_key=True)
     exam_name = Column(String, nullable=False)
     subject = Column(String, nullable=False)
-    year = Column(Integer, nullable=False)
+    year = Column(String, nullable=False)
     question_number = Column(String, nullable=False)
     part_label = Column(String, nullable=False)
     content = Column(Text, nullable=False)
     marks = Column(Integer)
     created_at = Column(TIMESTAMP, default=func.now())
+
+    __table_args__ = (
+        # a question part is identified by the paper it's from and its label
+        Index(
+            "exam_questions_key",
+            exam_name,
+            subject,
+            year,
+            question_number,
+            func.coalesce(part_label, ""),
+            unique=True,
+        ),
+    )
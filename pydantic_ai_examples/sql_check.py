@@ -0,0 +1,172 @@
+"""Cheap local checks of generated SQL, before it's sent to the database.
+
+Validating a generated query with `EXPLAIN` costs a database round trip, and a
+failure costs a model round trip on top. `precheck_sql` catches the obvious
+mistakes locally, such as a table or column which doesn't exist, and says what
+does exist so the model's retry can get it right. Tables and columns are read
+from the database's `information_schema` once and cached in a `SchemaCatalogue`.
+"""
+
+from __future__ import annotations as _annotations
+
+import asyncio
+import re
+from collections.abc import Mapping
+from typing import Any, Protocol
+
+Catalogue = dict[str, frozenset[str]]
+
+CATALOGUE_QUERY = """
+SELECT table_name, column_name
+FROM information_schema.columns
+WHERE table_schema = 'public'
+ORDER BY table_name, ordinal_position
+"""
+
+# string literals, quoted identifiers and comments, which could contain anything
+_NOT_CODE = re.compile(
+    r"'(?:[^']|'')*'"
+    r'|"[^"]*"'
+    r"|\$(\w*)\$.*?\$\1\$"
+    r"|(--[^\n]*|/\*.*?\*/)",
+    re.S,
+)
+# words which can follow a table name without being its alias
+_CLAUSE_KEYWORDS = set(
+    "WHERE JOIN INNER LEFT RIGHT FULL CROSS NATURAL ON USING GROUP ORDER LIMIT "
+    "OFFSET HAVING UNION EXCEPT INTERSECT WINDOW FOR".split()
+)
+# words which can follow `FROM` without being a table, e.g. `IS DISTINCT FROM NULL`
+_LITERALS = {"NULL", "TRUE", "FALSE"}
+
+
+class Database(Protocol):
+    async def execute(self, query: str) -> Any: ...
+
+
+class SchemaCatalogue:
+    """Tables and columns of a database's public schema, loaded on first use."""
+
+    def __init__(self):
+        self._catalogue: Catalogue | None = None
+        self._lock = asyncio.Lock()
+
+    async def get(self, db: Database) -> Catalogue:
+        if self._catalogue is None:
+            async with self._lock:
+                if self._catalogue is None:
+                    self._catalogue = catalogue_from_rows(
+                        await db.execute(CATALOGUE_QUERY) or []
+                    )
+        return self._catalogue
+
+    def clear(self) -> None:
+        """Reload the catalogue next time, e.g. after a migration."""
+        self._catalogue = None
+
+
+def catalogue_from_rows(rows: Any) -> Catalogue:
+    """Catalogue from `(table_name, column_name)` rows, as mappings or sequences."""
+    columns: dict[str, set[str]] = {}
+    for row in rows:
+        if isinstance(row, Mapping):
+            table, column = row["table_name"], row["column_name"]
+        else:
+            table, column = row[0], row[1]
+        columns.setdefault(table.lower(), set()).add(column.lower())
+    return {table: frozenset(names) for table, names in columns.items()}
+
+
+def describe(catalogue: Catalogue) -> str:
+    """The catalogue as one line per table, for a system prompt."""
+    return "\n".join(
+        f"{table}({', '.join(sorted(columns))})"
+        for table, columns in sorted(catalogue.items())
+    )
+
+
+def strip_sql(query: str) -> str:
+    """`query` with comments removed, and string literals and quoted names emptied."""
+    return _NOT_CODE.sub(lambda m: " " if m.group(2) else "''", query)
+
+
+def _in_function_call(code: str, pos: int) -> bool:
+    """Whether `pos` is in the parentheses of a function call, not of a subquery."""
+    depth = 0
+    for i in range(pos - 1, -1, -1):
+        if code[i] == ")":
+            depth += 1
+        elif code[i] == "(":
+            if depth == 0:
+                return not re.match(r"\s*(SELECT|WITH)\b", code[i + 1 :], re.I)
+            depth -= 1
+    return False
+
+
+def precheck_sql(query: str, catalogue: Catalogue) -> str | None:
+    """Find mistakes in `query` without asking the database.
+
+    Only mistakes which are certain are reported: a query which isn't a `SELECT`,
+    unbalanced parentheses, unknown tables, and unknown columns qualified with a
+    table name or alias. Anything else is left to `EXPLAIN`, as is everything but
+    the first two when the catalogue is empty.
+
+    Returns:
+        What's wrong with the query, or `None` if nothing was found
+    """
+    code = strip_sql(query)
+    if not re.match(r"\s*(SELECT|WITH)\b", code, re.I):
+        return "Please create a SELECT query"
+
+    depth = 0
+    for char in code:
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if depth < 0:
+            break
+    if depth:
+        return "Unbalanced parentheses"
+    if not catalogue:
+        return None
+
+    ctes = {name.lower() for name in re.findall(r"(\w+)\s+AS\s*\(", code, re.I)}
+    aliases: dict[str, str | None] = {}
+    for match in re.finditer(
+        r"\b(?:FROM|JOIN)\s+(?:ONLY\b\s*)?(?:(\w+)\.)?([A-Za-z_]\w*)\b(?!\s*\()"
+        r"(?:\s+(?:AS\s+)?(\w+))?",
+        code,
+        re.I,
+    ):
+        # e.g. `extract(day FROM created_at)`, set returning functions such as
+        # `FROM generate_series(...)` and `JOIN LATERAL (...)` aren't matched at all
+        if _in_function_call(code, match.start()):
+            continue
+        # `a IS [NOT] DISTINCT FROM b` compares values
+        if re.search(r"\bDISTINCT\s*$", code[: match.start()], re.I):
+            continue
+        schema, table, alias = match.groups()
+        if table.upper() in _LITERALS:
+            continue
+        table = table.lower()
+        # the catalogue only describes the public schema
+        if table in ctes or (schema and schema.lower() != "public"):
+            continue
+        if table not in catalogue:
+            return (
+                f"Table {table!r} does not exist, the tables are: "
+                f"{', '.join(sorted(catalogue))}"
+            )
+        names = [table]
+        if alias and alias.upper() not in _CLAUSE_KEYWORDS:
+            names.append(alias.lower())
+        for name in names:
+            # an alias used for different tables in different subqueries is ambiguous
+            aliases[name] = table if aliases.get(name, table) == table else None
+
+    for qualifier, column in re.findall(r"\b([A-Za-z_]\w*)\.([A-Za-z_]\w*)", code):
+        table = aliases.get(qualifier.lower())
+        if table is not None and column.lower() not in catalogue[table]:
+            return (
+                f"Column {qualifier}.{column} does not exist, {table} has columns: "
+                f"{', '.join(sorted(catalogue[table]))}"
+            )
+    return None
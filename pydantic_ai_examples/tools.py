@@ -0,0 +1,356 @@
+"""Concurrency limits and timeouts for agent tools.
+
+When a model asks for several tool calls in one response, the agent already runs
+them concurrently, and synchronous tools in a thread pool, so a turn takes about
+as long as its slowest call. What it doesn't offer is a way to protect whatever a
+tool calls: `limits` caps how many calls of one tool run at once and bounds how
+long each may take. Stack it under `@agent.tool`:
+
+    @agent.tool
+    @limits(max_concurrency=4, timeout=10)
+    async def weather_forecast(ctx: RunContext[WeatherService], location: str) -> str:
+        ...
+
+A call which times out raises `ModelRetry`, so the model is told and can try again
+or do without.
+
+`memoize` caches a tool's results, keyed on its arguments and a projection of the
+run's dependencies, so hot tools don't repeat the same database or API call within
+a run (e.g. after a retry) or across runs.
+
+A tool's JSON schema is generated once, when the `Tool` is created, but its
+`prepare` function runs for every tool on every model request. `cached_prepare`
+memoizes what it returns per tool and dependencies, and hands it a copy of the
+schema to change, so it can't modify the schema every other run shares.
+
+Compare tool-heavy turns with and without a concurrency cap, and the per-step cost
+of `prepare` functions with and without `cached_prepare`, with:
+
+    uv run -m pydantic_ai_examples.tools
+"""
+
+from __future__ import annotations as _annotations
+
+import asyncio
+import copy
+import functools
+import inspect
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from contextlib import AsyncExitStack
+from dataclasses import dataclass, replace
+from typing import Any, TypeVar
+
+import pydantic_core
+from pydantic_ai import ModelRetry, RunContext
+from pydantic_ai.tools import ToolDefinition, ToolPrepareFunc
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def limits(
+    max_concurrency: int | None = None, timeout: float | None = None
+) -> Callable[[F], F]:
+    """Limit concurrent calls of the decorated tool and how long each may take.
+
+    The wrapper is always async, synchronous tools are run with `asyncio.to_thread`.
+    A timed out synchronous call can't be interrupted, its thread runs to completion
+    in the background.
+
+    Args:
+        max_concurrency: Maximum calls running at once, further calls wait their turn
+        timeout: Seconds a call may run for, not counting time spent waiting its turn
+    """
+
+    def decorator(func: F) -> F:
+        # a semaphore belongs to the loop it's first used on, the tool may be called
+        # from several, e.g. once per `asyncio.run` or from several threads
+        semaphores: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, asyncio.Semaphore
+        ] = weakref.WeakKeyDictionary()
+        is_async = inspect.iscoroutinefunction(func)
+
+        # `wraps` keeps the signature and docstring, which the tool schema is built from
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            async with AsyncExitStack() as stack:
+                if max_concurrency:
+                    loop = asyncio.get_running_loop()
+                    semaphore = semaphores.get(loop)
+                    if semaphore is None:
+                        semaphore = semaphores[loop] = asyncio.Semaphore(
+                            max_concurrency
+                        )
+                    await stack.enter_async_context(semaphore)
+                call = (
+                    func(*args, **kwargs)
+                    if is_async
+                    else asyncio.to_thread(func, *args, **kwargs)
+                )
+                try:
+                    return await asyncio.wait_for(call, timeout)
+                except asyncio.TimeoutError:
+                    raise ModelRetry(
+                        f"{func.__name__} timed out after {timeout}s"
+                    ) from None
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    # calls which waited for an identical call already in flight
+    coalesced: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        calls = self.hits + self.misses + self.coalesced
+        return (self.hits + self.coalesced) / calls if calls else 0.0
+
+
+class ToolCache:
+    """LRU cache of tool results with a TTL, de-duplicating concurrent identical calls."""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.stats = CacheStats()
+        self._results: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._in_flight: dict[Hashable, asyncio.Task[Any]] = {}
+
+    async def get_or_call(self, key: Hashable, call: Callable[[], Any]) -> Any:
+        entry = self._results.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                self._results.move_to_end(key)
+                self.stats.hits += 1
+                return value
+            del self._results[key]
+
+        loop = asyncio.get_running_loop()
+        in_flight = self._in_flight.get(key)
+        # a call in flight on another event loop can't be awaited from this one
+        if in_flight is not None and in_flight.get_loop() is loop:
+            self.stats.coalesced += 1
+        else:
+            self.stats.misses += 1
+            in_flight = self._in_flight[key] = loop.create_task(self._call(key, call))
+            # retrieve the exception even if every caller was cancelled
+            in_flight.add_done_callback(lambda t: t.cancelled() or t.exception())
+        # the call belongs to the cache rather than to the first caller, so cancelling
+        # any one caller doesn't cancel it for the others
+        return await asyncio.shield(in_flight)
+
+    async def _call(self, key: Hashable, call: Callable[[], Any]) -> Any:
+        try:
+            value = await call()
+        finally:
+            if self._in_flight.get(key) is asyncio.current_task():
+                del self._in_flight[key]
+        # failures, including ModelRetry, aren't cached
+        self._results[key] = (time.monotonic() + self.ttl, value)
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+            self.stats.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        self._results.clear()
+
+
+def memoize(
+    ttl: float = 60,
+    maxsize: int = 1024,
+    deps_key: Callable[[Any], Hashable] | None = None,
+) -> Callable[[F], F]:
+    """Cache the decorated tool's results.
+
+    Results are keyed on the tool's arguments and `deps_key(ctx.deps)`, which should
+    pick out whatever in the dependencies the result depends on, e.g. the customer's
+    id. Without `deps_key`, calls with the same arguments share a result whatever
+    the dependencies. The cache is on the returned function as `.cache`, with hit
+    rate metrics in `.cache.stats`.
+
+    Args:
+        ttl: Seconds a result is reused for
+        maxsize: Maximum number of results kept, least recently used are evicted
+        deps_key: Projection of the run's dependencies which is part of the key
+    """
+
+    def decorator(func: F) -> F:
+        signature = inspect.signature(func)
+        cache = ToolCache(ttl, maxsize)
+        is_async = inspect.iscoroutinefunction(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            deps = None
+            for name, value in bound.arguments.items():
+                if isinstance(value, RunContext):
+                    del arguments[name]
+                    deps = value.deps
+            key = (
+                pydantic_core.to_json(arguments),
+                deps_key(deps) if deps_key else None,
+            )
+
+            async def call() -> Any:
+                if is_async:
+                    return await func(*args, **kwargs)
+                return await asyncio.to_thread(func, *args, **kwargs)
+
+            return await cache.get_or_call(key, call)
+
+        wrapper.cache = cache  # type: ignore[attr-defined]
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def cached_prepare(
+    fingerprint: Callable[[Any], Hashable], maxsize: int = 1024
+) -> Callable[[ToolPrepareFunc[Any]], ToolPrepareFunc[Any]]:
+    """Memoize the decorated `prepare` function per tool and dependencies.
+
+    The function is only called the first time a tool is prepared for a given
+    `fingerprint(ctx.deps)`, later steps and runs reuse the tool definition it
+    returned, or its `None`. It's given a copy of the tool's parameters schema, so
+    it may change it in place. Statistics are on the returned function as `.stats`.
+
+    Args:
+        fingerprint: Hashable projection of the run's dependencies which everything
+            the function does depends on, e.g. `lambda deps: deps.customer_id`
+        maxsize: Maximum number of tool definitions kept, least recently used are
+            evicted
+    """
+
+    def decorator(func: ToolPrepareFunc[Any]) -> ToolPrepareFunc[Any]:
+        stats = CacheStats()
+        prepared: OrderedDict[
+            Hashable, tuple[dict[str, Any], ToolDefinition | None]
+        ] = OrderedDict()
+
+        @functools.wraps(func)
+        async def wrapper(
+            ctx: RunContext[Any], tool_def: ToolDefinition
+        ) -> ToolDefinition | None:
+            # the tool's schema is the same dict on every step, keeping a reference to
+            # it in the entry means its id can't be reused by another tool's
+            schema = tool_def.parameters_json_schema
+            key = (tool_def.name, id(schema), fingerprint(ctx.deps))
+            if (entry := prepared.get(key)) is not None:
+                prepared.move_to_end(key)
+                stats.hits += 1
+                return entry[1]
+
+            stats.misses += 1
+            result = await func(
+                ctx, replace(tool_def, parameters_json_schema=copy.deepcopy(schema))
+            )
+            prepared[key] = (schema, result)
+            while len(prepared) > maxsize:
+                prepared.popitem(last=False)
+                stats.evictions += 1
+            return result
+
+        wrapper.stats = stats  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
+
+
+async def benchmark(calls: int = 8, tool_seconds: float = 0.1) -> None:
+    """Time one turn in which the model asks for `calls` calls of a slow tool."""
+    from pydantic_ai import Agent
+    from pydantic_ai.messages import ModelMessage, ModelResponse, TextPart, ToolCallPart
+    from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+    def model(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        if len(messages) == 1:
+            return ModelResponse(
+                parts=[
+                    ToolCallPart("slow_lookup", {"key": str(i)}) for i in range(calls)
+                ]
+            )
+        return ModelResponse(parts=[TextPart("done")])
+
+    for max_concurrency in (None, 2):
+        agent = Agent(FunctionModel(model))
+
+        @agent.tool_plain
+        @limits(max_concurrency=max_concurrency)
+        def slow_lookup(key: str) -> str:
+            """Look up `key` in a slow synchronous service."""
+            time.sleep(tool_seconds)
+            return key
+
+        start = time.perf_counter()
+        await agent.run("go")
+        print(
+            f"{calls} calls of {tool_seconds}s, max_concurrency={max_concurrency}: "
+            f"{time.perf_counter() - start:.2f}s"
+        )
+
+
+async def benchmark_prepare(steps: int = 20, runs: int = 5) -> None:
+    """Time each model request step of runs with a growing number of prepared tools."""
+    from pydantic_ai import Agent
+    from pydantic_ai.messages import ModelMessage, ModelResponse, TextPart, ToolCallPart
+    from pydantic_ai.models.function import AgentInfo, FunctionModel
+    from pydantic_ai.tools import Tool
+
+    def model(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        if len(messages) < steps * 2 - 1:
+            return ModelResponse(parts=[ToolCallPart("greet_0", {"name": "Ada"})])
+        return ModelResponse(parts=[TextPart("done")])
+
+    def greet(name: str) -> str:
+        """Greet someone.
+
+        Args:
+            name: Name of the person to greet
+        """
+        return f"Hello {name}"
+
+    async def describe_name(
+        ctx: RunContext[str], tool_def: ToolDefinition
+    ) -> ToolDefinition:
+        schema = copy.deepcopy(tool_def.parameters_json_schema)
+        schema["properties"]["name"]["description"] = f"Name of the {ctx.deps} to greet"
+        return replace(tool_def, parameters_json_schema=schema)
+
+    for tools in (1, 10, 100):
+        for name, prepare in (
+            ("prepare", describe_name),
+            ("cached_prepare", cached_prepare(lambda deps: deps)(describe_name)),
+        ):
+            agent = Agent(
+                FunctionModel(model),
+                deps_type=str,
+                tools=[
+                    Tool(greet, name=f"greet_{i}", prepare=prepare)
+                    for i in range(tools)
+                ],
+            )
+            await agent.run("go", deps="human")  # warm up
+            start = time.perf_counter()
+            for _ in range(runs):
+                await agent.run("go", deps="human")
+            per_step = (time.perf_counter() - start) / (runs * steps)
+            print(f"{tools:>3} tools, {name:<14}: {per_step * 1e3:6.2f}ms per step")
+
+
+if __name__ == "__main__":
+    asyncio.run(benchmark())
+    asyncio.run(benchmark_prepare())
@@ -1,13 +1,16 @@
 # Import Agent and RunContext from pydantic_ai
 # Agent: Main class for creating LLM agents with system prompts, tools and structured outputs
 # RunContext: Provides typed access to dependencies and context during agent execution
-import nest_asyncio
 from pydantic_ai import Agent, RunContext
 
-nest_asyncio.apply()  # for notebook
+from pydantic_ai_examples.http_pool import shared_model
+
+# runs agents on a background event loop, so this works in a notebook too
+from pydantic_ai_examples.loop_thread import run_sync
 
 roulette_agent = Agent(
-    model="google-gla:gemini-1.5-flash",
+    # reuse the process-wide connection pool rather than a client of its own
+    model=shared_model("google-gla:gemini-1.5-flash"),
     deps_type=int,
     output_type=bool,
     system_prompt=(
@@ -24,8 +27,10 @@ async def rolette_wheel(ctx: RunContext[int], square: int) -> str:
 
 # Run the agent
 success_number = 18
-result = roulette_agent.run_sync("Put my money on square eighteen", deps=success_number)
+result = run_sync(
+    roulette_agent, "Put my money on square eighteen", deps=success_number
+)
 print(result.output)
 
-result = roulette_agent.run_sync("I bet five is the winner", deps=success_number)
+result = run_sync(roulette_agent, "I bet five is the winner", deps=success_number)
 print(result.output)
@@ -1,6 +1,4 @@
-import asyncio
 from datetime import date
-import nest_asyncio
 from pydantic_ai import Agent, RunContext
 from dataclasses import dataclass
 from pydantic_ai.messages import (
@@ -13,7 +11,8 @@ from pydantic_ai.messages import (
     FunctionToolResultEvent,
 )
 
-nest_asyncio.apply()
+from pydantic_ai_examples.loop_thread import run_coroutine
+from pydantic_ai_examples.tools import limits, memoize
 
 
 @dataclass
@@ -35,7 +34,11 @@ weather_agent = Agent[WeatherService, str](
 )
 
 
+# several dates in one response are fetched concurrently, don't hammer the
+# weather service with more than four at a time or wait on it forever
 @weather_agent.tool
+@memoize(ttl=600)
+@limits(max_concurrency=4, timeout=10)
 async def weather_forecast(
     ctx: RunContext[WeatherService], location: str, forecast_date: date
 ) -> str:
@@ -102,6 +105,6 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run_coroutine(main())
 
     print("\n".join(output_messages))
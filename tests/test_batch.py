@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+from pydantic_ai import Agent
+
+from pydantic_ai_examples.batch import BatchScheduler, TokenBucket, run_batch
+from pydantic_ai_examples.fake_chat import FakeChatServer
+
+
+@pytest.mark.anyio
+async def test_token_bucket_paces_acquires():
+    bucket = TokenBucket(per_minute=600, capacity=2)
+
+    start = time.monotonic()
+    for _ in range(6):
+        await bucket.acquire(1)
+    elapsed = time.monotonic() - start
+
+    # two from the full bucket, then one every 0.1s
+    assert 0.35 < elapsed < 1
+
+
+@pytest.mark.anyio
+async def test_token_bucket_charge_goes_into_debt():
+    bucket = TokenBucket(per_minute=600, capacity=1)
+    await bucket.acquire(1)
+    bucket.charge(2)
+    assert bucket.available < -1.9
+
+    start = time.monotonic()
+    await bucket.acquire(1)
+    assert time.monotonic() - start > 0.25
+
+
+@pytest.mark.anyio
+async def test_token_bucket_caps_amount_at_capacity():
+    bucket = TokenBucket(per_minute=60, capacity=5)
+    await asyncio.wait_for(bucket.acquire(100), timeout=1)
+    assert bucket.available < 0.1
+
+
+@pytest.mark.anyio
+async def test_run_batch_within_rate_limits():
+    server = FakeChatServer(latency=0.01, requests_per_minute=1_200)
+    agent = Agent(server.model())
+    scheduler = BatchScheduler(requests_per_minute=1_200)
+
+    results = await run_batch(
+        agent, [(f"question {i}", None) for i in range(15)], scheduler
+    )
+
+    assert [result.output for result in results] == ["ok"] * 15
+    assert server.requests == 15
+    assert server.throttled == 0
+    assert scheduler.throttled == 0
+
+
+@pytest.mark.anyio
+async def test_run_batch_retries_when_throttled():
+    server = FakeChatServer(latency=0.01, requests_per_minute=600)
+    agent = Agent(server.model())
+
+    results = await run_batch(agent, [(f"question {i}", None) for i in range(15)])
+
+    assert [result.output for result in results] == ["ok"] * 15
+    assert server.requests == 15
+    assert server.throttled > 0
@@ -0,0 +1,88 @@
+import pytest
+
+from pydantic_ai_examples.embedding_cache import (
+    DIGEST_SIZE,
+    FLOAT_SIZE,
+    EmbeddingCache,
+    cached_embedding,
+)
+from pydantic_ai_examples.fake_embeddings import FakeEmbeddingsServer
+
+DIMENSIONS = 4
+SLOT_SIZE = DIGEST_SIZE + DIMENSIONS * FLOAT_SIZE
+MODEL = "text-embedding-3-small"
+
+
+def vector(i: int) -> list[float]:
+    return [float(i)] * DIMENSIONS
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = EmbeddingCache(
+        tmp_path, dimensions=DIMENSIONS, max_bytes=SLOT_SIZE * 3, memory_entries=1
+    )
+    yield cache
+    cache.close()
+
+
+def test_get_and_put(cache):
+    assert cache.get(MODEL, "hello") is None
+    cache.put(MODEL, "hello", vector(1))
+    assert cache.get(MODEL, "hello") == vector(1)
+    # whitespace is normalized, models don't share entries
+    assert cache.get(MODEL, "  hello\n") == vector(1)
+    assert cache.get("other-model", "hello") is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    with pytest.raises(ValueError, match="Expected 4 dimensions"):
+        cache.put(MODEL, "hello", [1.0])
+
+
+def test_evicts_least_recently_used(cache):
+    assert cache.capacity == 3
+    for i in range(3):
+        cache.put(MODEL, f"text {i}", vector(i))
+    # read from disk, the in-memory LRU only holds the last one put
+    assert cache.get(MODEL, "text 0") == vector(0)
+
+    cache.put(MODEL, "text 3", vector(3))
+
+    assert cache.get(MODEL, "text 1") is None
+    for i in (0, 2, 3):
+        assert cache.get(MODEL, f"text {i}") == vector(i)
+
+
+def test_persists_and_shrinks(tmp_path):
+    cache = EmbeddingCache(tmp_path, dimensions=DIMENSIONS, max_bytes=SLOT_SIZE * 3)
+    for i in range(3):
+        cache.put(MODEL, f"text {i}", vector(i))
+    cache.close()
+
+    cache = EmbeddingCache(tmp_path, dimensions=DIMENSIONS, max_bytes=SLOT_SIZE * 2)
+    try:
+        assert cache.get(MODEL, "text 0") == vector(0)
+        assert cache.get(MODEL, "text 1") == vector(1)
+        # its slot is beyond the new capacity
+        assert cache.get(MODEL, "text 2") is None
+        cache.put(MODEL, "text 3", vector(3))
+        assert cache.get(MODEL, "text 3") == vector(3)
+    finally:
+        cache.close()
+
+
+def test_too_small(tmp_path):
+    with pytest.raises(ValueError, match="can't hold a single embedding"):
+        EmbeddingCache(tmp_path, dimensions=DIMENSIONS, max_bytes=SLOT_SIZE - 1)
+
+
+@pytest.mark.anyio
+async def test_cached_embedding(cache):
+    server = FakeEmbeddingsServer(latency=0, dimensions=DIMENSIONS)
+    openai = server.client()
+
+    first = await cached_embedding(openai, "hello", MODEL, cache)
+    again = await cached_embedding(openai, " hello ", MODEL, cache)
+
+    assert first == pytest.approx(again)
+    assert server.requests == 1
@@ -0,0 +1,96 @@
+import pytest
+
+from pydantic_ai_examples.embeddings import (
+    MAX_INPUT_TOKENS,
+    AdaptiveLimiter,
+    BatchEmbedder,
+    estimate_tokens,
+    token_batches,
+)
+from pydantic_ai_examples.fake_embeddings import FakeEmbeddingsServer, fake_embedding
+
+DIMENSIONS = 8
+
+
+def test_token_batches_bounded_by_tokens_and_inputs():
+    texts = [f"text {i:02} " * 10 for i in range(25)]
+    tokens = estimate_tokens(texts[0])
+
+    batches = list(token_batches(texts, str, max_tokens=tokens * 4, max_inputs=3))
+
+    assert [text for batch in batches for text in batch] == texts
+    assert all(len(batch) <= 3 for batch in batches)
+    assert [len(batch) for batch in batches] == [3] * 8 + [1]
+
+    batches = list(token_batches(texts, str, max_tokens=tokens * 2, max_inputs=10))
+    assert [len(batch) for batch in batches] == [2] * 12 + [1]
+
+
+def test_token_batches_oversized_input_gets_its_own_batch():
+    huge = "x" * (MAX_INPUT_TOKENS * 8)
+    batches = list(token_batches(["a", huge, "b"], str, max_tokens=MAX_INPUT_TOKENS))
+    assert batches == [["a"], [huge], ["b"]]
+    assert list(token_batches([], str)) == []
+
+
+@pytest.mark.anyio
+async def test_embed_batches():
+    server = FakeEmbeddingsServer(latency=0.01, dimensions=DIMENSIONS)
+    embedder = BatchEmbedder(server.client(), max_batch_inputs=10)
+    texts = [f"section {i}" for i in range(95)]
+
+    embedded: dict[str, list[float]] = {}
+    async for batch, embeddings in embedder.embed_batches(texts, str):
+        assert len(batch) == len(embeddings)
+        embedded.update(zip(batch, embeddings))
+
+    assert server.requests == 10
+    assert server.inputs == 95
+    assert embedded == {text: fake_embedding(text, DIMENSIONS) for text in texts}
+
+
+@pytest.mark.anyio
+async def test_embed_batches_retries_when_throttled():
+    server = FakeEmbeddingsServer(
+        latency=0.02, max_concurrency=2, dimensions=DIMENSIONS
+    )
+    limiter = AdaptiveLimiter(initial=8, maximum=8)
+    embedder = BatchEmbedder(server.client(), max_batch_inputs=1, limiter=limiter)
+    texts = [f"section {i}" for i in range(20)]
+
+    embedded = {
+        text: embedding
+        async for batch, embeddings in embedder.embed_batches(texts, str)
+        for text, embedding in zip(batch, embeddings)
+    }
+
+    assert server.throttled > 0
+    assert server.requests == 20
+    assert embedded == {text: fake_embedding(text, DIMENSIONS) for text in texts}
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.anyio
+async def test_embed_gives_up_after_max_retries():
+    from openai import RateLimitError
+
+    server = FakeEmbeddingsServer(latency=0, max_concurrency=0, dimensions=DIMENSIONS)
+    embedder = BatchEmbedder(server.client(), max_retries=2)
+
+    with pytest.raises(RateLimitError):
+        await embedder.embed(["hello"])
+    assert server.throttled == 3
+    assert embedder.limiter.limit == embedder.limiter.minimum
+
+
+def test_adaptive_limiter():
+    limiter = AdaptiveLimiter(initial=4, minimum=1, maximum=6)
+    limiter.on_success()
+    limiter.on_success()
+    limiter.on_success()
+    assert limiter.limit == 6
+    limiter.on_throttle()
+    assert limiter.limit == 3
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.limit == 1
@@ -0,0 +1,109 @@
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from pydantic_ai_examples.history import CompactingHistory, render
+
+pytestmark = pytest.mark.anyio
+
+
+def summarizer(prompts: list[str]) -> FunctionModel:
+    def summarize(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        prompts.append(messages[-1].parts[-1].content)
+        return ModelResponse(parts=[TextPart(f"summary {len(prompts)}")])
+
+    return FunctionModel(summarize)
+
+
+def tool_turn(question: str, payload: str) -> list[ModelMessage]:
+    return [
+        ModelRequest(parts=[UserPromptPart(question)]),
+        ModelResponse(parts=[ToolCallPart("lookup", {}, tool_call_id="1")]),
+        ModelRequest(parts=[ToolReturnPart("lookup", payload, tool_call_id="1")]),
+        ModelResponse(parts=[TextPart("answer")]),
+    ]
+
+
+def tool_returns(messages: list[ModelMessage]) -> list[str]:
+    return [
+        part.content
+        for message in messages
+        for part in message.parts
+        if isinstance(part, ToolReturnPart)
+    ]
+
+
+def test_elide_tool_returns_over_budget_oldest_first():
+    history = CompactingHistory(summarizer([]), tool_return_budget=300)
+    # about 200 tokens each
+    messages = [
+        *tool_turn("first", "a" * 800),
+        *tool_turn("second", "b" * 800),
+    ]
+
+    compacted = history._elide_tool_returns(messages)
+
+    old, new = tool_returns(compacted)
+    assert old == "[201 tokens elided, call lookup again if they're needed]"
+    assert new == "b" * 800
+    # the transcript itself is unchanged
+    assert tool_returns(messages) == ["a" * 800, "b" * 800]
+
+
+def test_elide_tool_returns_within_budget():
+    history = CompactingHistory(summarizer([]), tool_return_budget=1_000)
+    messages = [*tool_turn("first", "a" * 800), *tool_turn("second", "b" * 800)]
+    assert tool_returns(history._elide_tool_returns(messages)) == [
+        "a" * 800,
+        "b" * 800,
+    ]
+
+
+async def test_older_turns_are_summarized_incrementally():
+    prompts: list[str] = []
+    history = CompactingHistory(summarizer(prompts), keep_turns=2)
+    sent: list[list[ModelMessage]] = []
+
+    def chat(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        sent.append(messages)
+        return ModelResponse(parts=[TextPart(f"answer {len(sent)}")])
+
+    agent = Agent(FunctionModel(chat), system_prompt="You are a support agent.")
+    for turn in range(8):
+        await history.run(agent, f"question {turn}")
+
+    # summarized two turns at a time, before the runs of turns 4 and 6
+    assert len(prompts) == 2
+    assert "question 0" in prompts[0] and "question 2" not in prompts[0]
+    assert prompts[1].startswith("Summary so far:\nsummary 1")
+    assert "question 2" in prompts[1] and "question 0" not in prompts[1]
+
+    first, *recent = sent[-1]
+    assert [part.content for part in first.parts] == [
+        "You are a support agent.",
+        "Summary of the conversation so far:\nsummary 2",
+    ]
+    assert all(isinstance(part, SystemPromptPart) for part in first.parts)
+    assert "question 3" not in render(recent)
+    assert all(f"question {turn}" in render(recent) for turn in (4, 5, 6, 7))
+    # the full transcript is kept
+    assert len(history.messages) == 16
+    assert history.summary_usage.requests == 2
+
+
+async def test_short_conversations_are_sent_verbatim():
+    history = CompactingHistory(summarizer([]), keep_turns=4)
+    agent = Agent(FunctionModel(lambda m, i: ModelResponse(parts=[TextPart("ok")])))
+    for turn in range(3):
+        await history.run(agent, f"question {turn}")
+    assert await history.compact() == history.messages
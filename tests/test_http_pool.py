@@ -0,0 +1,82 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pydantic_ai_examples.http_pool import HttpPools, PoolConfig
+
+
+class Handler(BaseHTTPRequestHandler):
+    # keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.anyio
+async def test_requests_reuse_pooled_connections(server_url):
+    pools = HttpPools()
+    try:
+        client = pools.client("openai")
+        assert pools.client("openai") is client
+        for _ in range(3):
+            assert (await client.get(server_url)).text == "ok"
+        await pools.client("google-gla").get(server_url)
+
+        assert pools.stats() == {
+            "openai": {"requests": 3, "connections_opened": 1},
+            "google-gla": {"requests": 1, "connections_opened": 1},
+        }
+    finally:
+        await pools.aclose()
+
+
+@pytest.mark.anyio
+async def test_closed_client_is_recreated(server_url):
+    pools = HttpPools()
+    try:
+        client = pools.client("openai")
+        await client.get(server_url)
+        # e.g. `AsyncOpenAI.close()` closes the client it was given
+        await client.aclose()
+
+        recreated = pools.client("openai")
+        assert recreated is not client
+        assert not recreated.is_closed
+        await recreated.get(server_url)
+        # statistics are kept per provider, across clients
+        assert pools.stats()["openai"] == {"requests": 2, "connections_opened": 2}
+    finally:
+        await pools.aclose()
+    assert recreated.is_closed
+
+
+@pytest.mark.anyio
+async def test_configure():
+    pools = HttpPools()
+    pools.configure("openai", PoolConfig(max_connections=2, timeout=3))
+    try:
+        client = pools.client("openai")
+        assert client.timeout.read == 3
+        assert client.timeout.connect == 5
+        with pytest.raises(ValueError, match="already been created"):
+            pools.configure("openai", PoolConfig())
+    finally:
+        await pools.aclose()
@@ -0,0 +1,92 @@
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+
+from pydantic_ai_examples import ingest
+from pydantic_ai_examples.ingest import Checkpoint, IngestSummary, ingest_archive
+from pydantic_ai_examples.model import ExamQuestion, Failed, QuestionPart, Questions
+
+QUESTIONS = Questions(
+    questions=[
+        ExamQuestion(
+            question_number="1", parts=[QuestionPart(content="What is 2 + 2?")]
+        )
+    ]
+)
+
+
+def test_checkpoint_survives_a_restart(tmp_path):
+    checkpoint = Checkpoint(tmp_path)
+    checkpoint.save_questions("abc", QUESTIONS)
+    checkpoint.record("abc", "a.pdf", "extracted")
+    checkpoint.record("def", "b.pdf", "failed", error="boom")
+
+    restarted = Checkpoint(tmp_path)
+    assert restarted.status("abc") == "extracted"
+    assert restarted.status("def") == "failed"
+    assert restarted.status("missing") is None
+    assert restarted.load_questions("abc") == QUESTIONS
+    assert json.loads((tmp_path / "state.json").read_text())["def"] == {
+        "path": "b.pdf",
+        "status": "failed",
+        "error": "boom",
+    }
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+@pytest.mark.anyio
+async def test_ingest_resumes_from_the_checkpoint(tmp_path, monkeypatch):
+    papers = {"a.pdf": b"%PDF a", "b.pdf": b"%PDF b", "c.pdf": b"%PDF c"}
+    for name, data in papers.items():
+        (tmp_path / name).write_bytes(data)
+    metadata = {"exam_name": "GCSE", "subject": "Maths", "year": "2024"}
+    (tmp_path / "manifest.json").write_text(
+        json.dumps({name: metadata for name in papers})
+    )
+
+    extracted: list[bytes] = []
+    loaded: list[str] = []
+    fail_loading = {"Question from b"}
+
+    async def extract_from_pdf(data, deps, chunked=False):
+        extracted.append(bytes(data))
+        if bytes(data) == b"%PDF c":
+            return Failed()
+        content = f"Question from {bytes(data)[-1:].decode()}"
+        return Questions(
+            questions=[
+                ExamQuestion(question_number="1", parts=[QuestionPart(content=content)])
+            ]
+        )
+
+    async def load_data_into_milvus(questions, openai, session, **metadata):
+        content = questions[0].parts[0].content
+        if content in fail_loading:
+            raise RuntimeError("Milvus is down")
+        loaded.append(content)
+
+    @asynccontextmanager
+    async def sessionmaker():
+        yield None
+
+    monkeypatch.setattr(ingest, "extract_from_pdf", extract_from_pdf)
+    monkeypatch.setattr(ingest, "load_data_into_milvus", load_data_into_milvus)
+    monkeypatch.setattr(ingest, "get_openai", lambda: None)
+    monkeypatch.setattr(ingest, "get_sessionmaker", lambda: sessionmaker)
+
+    summary = await ingest_archive(tmp_path)
+    assert summary == IngestSummary(loaded=1, no_questions=1, failed=1)
+    assert sorted(extracted) == sorted(papers.values())
+    assert loaded == ["Question from a"]
+
+    # b's questions were extracted before loading failed, only loading is retried
+    extracted.clear()
+    fail_loading.clear()
+    summary = await ingest_archive(tmp_path)
+    assert summary == IngestSummary(loaded=1, skipped=2)
+    assert extracted == []
+    assert loaded == ["Question from a", "Question from b"]
+
+    summary = await ingest_archive(tmp_path)
+    assert summary == IngestSummary(skipped=3)
@@ -0,0 +1,43 @@
+import threading
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.models.test import TestModel
+
+from pydantic_ai_examples.loop_thread import LoopThread
+from pydantic_ai_examples.resources import resources
+
+
+def test_run_sync_on_background_loop():
+    loop_thread = LoopThread(name="test-loop")
+    try:
+        result = loop_thread.run(Agent(TestModel()).run("hello"))
+        assert result.output == "success (no tool calls)"
+        assert loop_thread._thread is not None
+        assert loop_thread._thread.is_alive()
+    finally:
+        loop_thread.stop()
+    assert not any(t.name == "test-loop" for t in threading.enumerate())
+
+
+def test_failed_startup_stops_the_loop(monkeypatch):
+    calls: list[int] = []
+
+    def fail() -> None:
+        calls.append(1)
+        raise RuntimeError("no database")
+
+    monkeypatch.setattr(resources, "_startup_hooks", [fail])
+    loop_thread = LoopThread(name="test-failing-loop")
+
+    async def nothing() -> None:
+        pass
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError, match="no database"):
+            loop_thread.run(nothing())
+
+    # each attempt ran the hooks again, and left no thread behind
+    assert len(calls) == 2
+    assert loop_thread._loop is None
+    assert not any(t.name == "test-failing-loop" for t in threading.enumerate())
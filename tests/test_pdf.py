@@ -0,0 +1,95 @@
+import pytest
+from pydantic_ai import Agent, BinaryContent
+from pydantic_ai.messages import ModelMessagesTypeAdapter
+from pydantic_ai.models.test import TestModel
+from pydantic_core import PydanticSerializationError
+
+from pydantic_ai_examples.model import ExamQuestion, QuestionPart, Questions
+from pydantic_ai_examples.pdf import (
+    map_file,
+    merge_questions,
+    persistable,
+    window_ranges,
+)
+
+
+def questions(*parts: tuple[str, str | None, str, int | None]) -> Questions:
+    grouped: dict[str, list[QuestionPart]] = {}
+    for number, label, content, marks in parts:
+        grouped.setdefault(number, []).append(
+            QuestionPart(part_label=label, content=content, marks=marks)
+        )
+    return Questions(
+        questions=[
+            ExamQuestion(question_number=number, parts=parts)
+            for number, parts in grouped.items()
+        ]
+    )
+
+
+def test_merge_questions_keeps_longest_copy_of_a_cut_part():
+    first = questions(
+        ("1", "(a)", "What is 2 + 2?", 1),
+        ("1", "(b)", "Prove that", None),
+    )
+    second = questions(
+        ("1", "(b)", "Prove that the square root of 2 is irrational.", None),
+        ("1", "(c)", "Hence", 4),
+        ("2", None, "Define a group.", 3),
+    )
+    third = questions(("1", "(c)", "Hence", None), ("1", "(b)", "Prove", 5))
+
+    merged = merge_questions([first, second, third])
+
+    assert merged == questions(
+        ("1", "(a)", "What is 2 + 2?", 1),
+        ("1", "(b)", "Prove that the square root of 2 is irrational.", 5),
+        ("1", "(c)", "Hence", 4),
+        ("2", None, "Define a group.", 3),
+    )
+
+
+def test_merge_questions_longer_copy_keeps_known_marks():
+    merged = merge_questions(
+        [
+            questions(("3", "(a)", "Solve", 6)),
+            questions(("3", "(a)", "Solve for x.", None)),
+        ]
+    )
+    assert merged == questions(("3", "(a)", "Solve for x.", 6))
+    assert merge_questions([]) == Questions(questions=[])
+
+
+def test_window_ranges():
+    assert window_ranges(10, 4, 1) == [(0, 4), (3, 7), (6, 10)]
+    assert window_ranges(3, 4, 1) == [(0, 3)]
+    assert window_ranges(0, 4, 1) == [(0, 0)]
+    with pytest.raises(ValueError):
+        window_ranges(10, 4, 4)
+
+
+def test_map_file(tmp_path):
+    path = tmp_path / "paper.pdf"
+    path.write_bytes(b"%PDF-1.4 pages")
+    assert map_file(path) == b"%PDF-1.4 pages"
+    (tmp_path / "empty.pdf").write_bytes(b"")
+    assert map_file(tmp_path / "empty.pdf") == b""
+
+
+@pytest.mark.anyio
+async def test_persistable_messages_with_mapped_pdf(tmp_path):
+    path = tmp_path / "paper.pdf"
+    path.write_bytes(b"%PDF-1.4 pages")
+    result = await Agent(TestModel()).run(
+        ["Extract", BinaryContent(data=map_file(path), media_type="application/pdf")]
+    )
+
+    with pytest.raises(PydanticSerializationError, match="memoryview"):
+        ModelMessagesTypeAdapter.dump_json(result.all_messages())
+
+    messages = persistable(result.all_messages())
+    request, _ = ModelMessagesTypeAdapter.validate_json(
+        ModelMessagesTypeAdapter.dump_json(messages)
+    )
+    assert request.parts[0].content[1].data == b"%PDF-1.4 pages"
+    assert isinstance(result.all_messages()[0].parts[0].content[1].data, memoryview)
@@ -0,0 +1,66 @@
+from collections.abc import AsyncIterator
+
+import pytest
+from pydantic_ai import Agent, RunContext
+from pydantic_ai.messages import ModelMessage, ModelResponse, TextPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from pydantic_ai_examples.prompt_cache import PrefixCachedModel
+
+pytestmark = pytest.mark.anyio
+
+STATIC_PROMPT = "You extract exam questions."
+
+
+def make_agent() -> tuple[Agent[str, str], list[list[str]]]:
+    received: list[list[str]] = []
+
+    def system_prompts(messages: list[ModelMessage]) -> list[str]:
+        return [
+            part.content
+            for part in messages[0].parts
+            if part.part_kind == "system-prompt"
+        ]
+
+    def respond(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        received.append(system_prompts(messages))
+        return ModelResponse(parts=[TextPart("ok")])
+
+    async def stream(
+        messages: list[ModelMessage], info: AgentInfo
+    ) -> AsyncIterator[str]:
+        received.append(system_prompts(messages))
+        yield "ok"
+
+    agent = Agent(
+        PrefixCachedModel(
+            FunctionModel(respond, stream_function=stream), [STATIC_PROMPT]
+        ),
+        deps_type=str,
+    )
+
+    @agent.system_prompt
+    def customer(ctx: RunContext[str]) -> str:
+        return f"The customer is {ctx.deps}"
+
+    @agent.system_prompt
+    def static() -> str:
+        return STATIC_PROMPT
+
+    return agent, received
+
+
+async def test_static_prompts_first():
+    agent, received = make_agent()
+    result = await agent.run("hello", deps="Ada")
+
+    assert received == [[STATIC_PROMPT, "The customer is Ada"]]
+    assert result.usage().details == {"cached_tokens": 0}
+
+
+async def test_static_prompts_first_when_streaming():
+    agent, received = make_agent()
+    async with agent.run_stream("hello", deps="Ada") as result:
+        assert await result.get_output() == "ok"
+
+    assert received == [[STATIC_PROMPT, "The customer is Ada"]]
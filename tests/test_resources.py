@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+from pydantic_ai_examples.resources import Resources
+
+
+def test_factory_can_get_another_resource():
+    registry = Resources()
+    get_client = registry.register("client", lambda: object())
+    get_model = registry.register("model", lambda: ("model", get_client()))
+
+    result: list[object] = []
+    # a deadlock would hang the test, run it in a thread which can be abandoned
+    thread = threading.Thread(target=lambda: result.append(get_model()), daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive(), "getting a resource from a factory deadlocked"
+    assert result == [("model", get_client())]
+
+
+def test_resource_is_created_once():
+    registry = Resources()
+    created: list[object] = []
+    get_thing = registry.register(
+        "thing", lambda: created.append(object()) or created[-1]
+    )
+
+    assert get_thing() is get_thing()
+    assert len(created) == 1
+
+
+@pytest.mark.anyio
+async def test_shutdown_closes_newest_first():
+    registry = Resources()
+    closed: list[str] = []
+    get_a = registry.register("a", lambda: "a", close=closed.append)
+    get_b = registry.register("b", lambda: "b", close=closed.append)
+
+    async with registry.lifespan():
+        get_a()
+        get_b()
+
+    assert closed == ["b", "a"]
+
+
+def test_extract_model_with_response_cache(monkeypatch, tmp_path):
+    from pydantic_ai_examples import question_extractor
+    from pydantic_ai_examples.response_cache import CachedModel
+    from pydantic_ai_examples.resources import resources
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("RESPONSE_CACHE_PATH", str(tmp_path / "responses.sqlite"))
+    result: list[object] = []
+    thread = threading.Thread(
+        target=lambda: result.append(question_extractor.get_extract_model()),
+        daemon=True,
+    )
+    thread.start()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive(), "creating the extract model deadlocked"
+    try:
+        assert isinstance(result[0], CachedModel)
+    finally:
+        resources._instances.pop("extract_model", None)
+        if cache := resources._instances.pop("response_cache", None):
+            cache.close()
@@ -0,0 +1,109 @@
+import time
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelMessagesTypeAdapter,
+    ModelResponse,
+    TextPart,
+)
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from pydantic_ai_examples.response_cache import CachedModel, ResponseCache
+
+
+def response(text: str) -> ModelResponse:
+    return ModelResponse(parts=[TextPart(text)])
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    yield cache
+    cache.close()
+
+
+def test_get_and_put(cache):
+    assert cache.get("a") is None
+    cache.put("a", response("hello"))
+    assert cache.get("a").parts == [TextPart("hello")]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["bytes"] > 0
+
+
+def test_expires_after_ttl(tmp_path):
+    cache = ResponseCache(tmp_path / "responses.sqlite", ttl=0.05)
+    try:
+        cache.put("a", response("hello"))
+        assert cache.get("a") is not None
+        time.sleep(0.06)
+        assert cache.get("a") is None
+        assert cache.stats()["entries"] == 0
+
+        # expired responses are also dropped when another is stored
+        cache.put("b", response("hello"))
+        time.sleep(0.06)
+        cache.put("c", response("hello"))
+        assert cache.stats()["entries"] == 1
+        assert cache.evictions == 1
+    finally:
+        cache.close()
+
+
+def test_evicts_least_recently_used(tmp_path):
+    size = len(ModelMessagesTypeAdapter.dump_json([response("response 0")]))
+    cache = ResponseCache(tmp_path / "responses.sqlite", max_bytes=size * 3)
+    try:
+        for i in range(3):
+            cache.put(f"key {i}", response(f"response {i}"))
+        assert cache.get("key 0") is not None
+
+        cache.put("key 3", response("response 3"))
+
+        assert cache.stats()["entries"] == 3
+        assert cache.evictions == 1
+        assert cache.get("key 1") is None
+        for i in (0, 2, 3):
+            assert cache.get(f"key {i}").parts == [TextPart(f"response {i}")]
+    finally:
+        cache.close()
+
+
+def test_persists(tmp_path):
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    cache.put("a", response("hello"))
+    cache.close()
+
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+    try:
+        assert cache.get("a").parts == [TextPart("hello")]
+        cache.clear()
+        assert cache.get("a") is None
+    finally:
+        cache.close()
+
+
+@pytest.mark.anyio
+async def test_cached_model_serves_repeated_requests(cache):
+    calls = 0
+
+    def model(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        nonlocal calls
+        calls += 1
+        return response(f"answer {calls}")
+
+    agent = Agent(CachedModel(FunctionModel(model), cache))
+
+    first = await agent.run("What is 2 + 2?")
+    again = await agent.run("What is 2 + 2?")
+    other = await agent.run("What is 3 + 3?")
+
+    assert (first.output, again.output, other.output) == (
+        "answer 1",
+        "answer 1",
+        "answer 2",
+    )
+    assert calls == 2
+    assert again.usage().details == {"response_cache_hits": 1}
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from pydantic_ai_examples.rag import retrieval_backend
+from pydantic_ai_examples.retrieval import LocalIndex, RetrievedSection
+
+ROWS = 500
+DIMENSIONS = 16
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(ROWS, DIMENSIONS)).astype(np.float32)
+    LocalIndex.build(
+        tmp_path,
+        (
+            (f"https://docs/{i}", f"Section {i}", f"content {i}", vector.tolist())
+            for i, vector in enumerate(vectors)
+        ),
+        ivf_lists=10,
+    )
+    return tmp_path
+
+
+def brute_force(index: LocalIndex, query: np.ndarray, limit: int) -> list[int]:
+    distances = ((np.asarray(index.vectors) - query) ** 2).sum(axis=1)
+    return np.argsort(distances)[:limit].tolist()
+
+
+@pytest.mark.anyio
+async def test_exact_search(index_path):
+    index = LocalIndex(index_path)
+    query = np.asarray(index.vectors[42]) + 0.01
+
+    assert index.search_ids(query.tolist(), 5).tolist() == brute_force(index, query, 5)
+    sections = await index.search(query.tolist(), 1)
+    assert sections == [RetrievedSection("https://docs/42", "Section 42", "content 42")]
+    assert len(index.search_ids(query.tolist(), ROWS * 2)) == ROWS
+
+
+def test_ivf_search(index_path):
+    exact = LocalIndex(index_path)
+    rng = np.random.default_rng(1)
+    queries = rng.normal(size=(20, DIMENSIONS)).astype(np.float32)
+
+    # probing every partition scans every row
+    ivf = LocalIndex(index_path, mode="ivf", nprobe=10)
+    for query in queries:
+        assert ivf.search_ids(query.tolist(), 5).tolist() == brute_force(
+            exact, query, 5
+        )
+
+    # a row is always found in its own partition
+    ivf = LocalIndex(index_path, mode="ivf", nprobe=1)
+    for i in (0, 123, 499):
+        assert ivf.search_ids(exact.vectors[i].tolist(), 1).tolist() == [i]
+
+
+def test_unknown_mode(index_path):
+    with pytest.raises(ValueError, match="Unknown search mode 'IVF'"):
+        LocalIndex(index_path, mode="IVF")  # type: ignore[arg-type]
+
+
+def test_build_without_rows(tmp_path):
+    with pytest.raises(ValueError, match="without any rows"):
+        LocalIndex.build(tmp_path, [])
+
+
+@pytest.mark.anyio
+async def test_retrieval_backend_checks_the_mode(index_path, monkeypatch):
+    monkeypatch.setenv("RAG_BACKEND", "local")
+    monkeypatch.setenv("RAG_LOCAL_INDEX", str(index_path))
+    monkeypatch.setenv("RAG_LOCAL_MODE", "ivf")
+    async with retrieval_backend() as backend:
+        assert isinstance(backend, LocalIndex)
+        assert backend.mode == "ivf"
+
+    monkeypatch.setenv("RAG_LOCAL_MODE", "IVF")
+    with pytest.raises(ValueError, match="Unknown RAG_LOCAL_MODE 'IVF'"):
+        async with retrieval_backend():
+            pass
@@ -0,0 +1,21 @@
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql.asyncpg import dialect
+
+from pydantic_ai_examples import schema
+
+
+def test_year_binds_as_varchar():
+    # asyncpg doesn't coerce strings, the column type must match the table's VARCHAR
+    statement = insert(schema.ExamQuestion).values(
+        exam_name="KCSE",
+        subject="CRE",
+        year="2024",
+        question_number="1",
+        part_label="a",
+        content="Describe the call of Abraham",
+    )
+    compiled = str(statement.compile(dialect=dialect()))
+    assert "$3::VARCHAR" in compiled
+
+    query = select(schema.ExamQuestion).filter_by(year="2024")
+    assert "year = $1::VARCHAR" in str(query.compile(dialect=dialect()))
@@ -0,0 +1,119 @@
+import pytest
+
+from pydantic_ai_examples.sql_check import (
+    SchemaCatalogue,
+    catalogue_from_rows,
+    describe,
+    precheck_sql,
+    strip_sql,
+)
+
+CATALOGUE = catalogue_from_rows(
+    [
+        ("users", "id"),
+        ("users", "name"),
+        ("users", "last_active"),
+        ("orders", "id"),
+        ("orders", "user_id"),
+        ("orders", "total"),
+    ]
+)
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "SELECT * FROM users WHERE last_active::date = current_date - 1",
+        "SELECT u.name, o.total FROM users u JOIN orders AS o ON o.user_id = u.id",
+        "SELECT extract(day FROM last_active) FROM users",
+        "WITH recent AS (SELECT * FROM users) SELECT recent.foo FROM recent",
+        "SELECT * FROM (SELECT id FROM users) sub WHERE sub.id > 1",
+        "SELECT * FROM pg_catalog.pg_tables",
+        "SELECT g FROM generate_series(1, 3) g",
+        "SELECT count(*) FROM users WHERE name = 'a.b FROM nope'",
+        "SELECT * FROM users, orders WHERE orders.total > 1",
+        "SELECT * FROM users o WHERE exists (SELECT 1 FROM orders o WHERE o.total > 1)",
+        "SELECT * FROM users -- active from yesterday",
+        "SELECT * FROM users /* pulled from logs */ WHERE id = 1",
+        "SELECT * FROM users /* from\nlogs */",
+        "-- users from yesterday\nSELECT * FROM users",
+        "SELECT * FROM users WHERE name = '-- from nowhere'",
+        "SELECT * FROM users WHERE name = $$it's from me$$",
+        'SELECT "name" FROM users',
+        "SELECT * FROM users WHERE name IS DISTINCT FROM NULL",
+        "SELECT * FROM users WHERE id IS NOT DISTINCT FROM 5",
+        "SELECT * FROM users u WHERE u.name IS DISTINCT FROM u.last_active",
+        "SELECT * FROM ONLY users",
+        "SELECT u.name FROM ONLY users AS u JOIN ONLY orders o ON o.user_id = u.id",
+        "SELECT * FROM users WHERE (name = 'a') IS DISTINCT FROM TRUE",
+    ],
+)
+def test_valid_queries_pass(query: str):
+    assert precheck_sql(query, CATALOGUE) is None
+
+
+@pytest.mark.parametrize(
+    "query, error",
+    [
+        ("DELETE FROM users", "Please create a SELECT query"),
+        ("-- SELECT\nDELETE FROM users", "Please create a SELECT query"),
+        ("SELECT (1 FROM users", "Unbalanced parentheses"),
+        ("SELECT * FROM user WHERE id = 1", "Table 'user' does not exist"),
+        ("SELECT * FROM users u JOIN order o ON true", "Table 'order' does not exist"),
+        ("SELECT u.lastactive FROM users u", "Column u.lastactive does not exist"),
+        ("SELECT * FROM ONLY user", "Table 'user' does not exist"),
+        ("SELECT o.price FROM ONLY orders o", "Column o.price does not exist"),
+        (
+            "SELECT * FROM public.orders o -- big ones\nWHERE o.price > 1",
+            "Column o.price does not exist",
+        ),
+    ],
+)
+def test_certain_mistakes_are_reported(query: str, error: str):
+    assert error in precheck_sql(query, CATALOGUE)
+
+
+def test_retry_message_lists_what_exists():
+    error = precheck_sql("SELECT u.email FROM users u", CATALOGUE)
+    assert error == (
+        "Column u.email does not exist, users has columns: id, last_active, name"
+    )
+
+
+def test_empty_catalogue_only_checks_the_statement():
+    assert precheck_sql("SELECT * FROM anything", {}) is None
+    assert precheck_sql("DROP TABLE users", {}) == "Please create a SELECT query"
+
+
+def test_strip_sql():
+    assert strip_sql("SELECT 'x -- y' -- z\nFROM t /* c */") == (
+        "SELECT ''  \nFROM t  "
+    )
+
+
+def test_catalogue_from_mapping_rows():
+    rows = [{"table_name": "Users", "column_name": "ID"}]
+    assert catalogue_from_rows(rows) == {"users": frozenset({"id"})}
+    assert describe(CATALOGUE) == (
+        "orders(id, total, user_id)\nusers(id, last_active, name)"
+    )
+
+
+@pytest.mark.anyio
+async def test_catalogue_is_loaded_once():
+    class Database:
+        queries = 0
+
+        async def execute(self, query: str):
+            self.queries += 1
+            return [("users", "id")]
+
+    db = Database()
+    catalogue = SchemaCatalogue()
+    assert await catalogue.get(db) == {"users": frozenset({"id"})}
+    assert await catalogue.get(db) is await catalogue.get(db)
+    assert db.queries == 1
+
+    catalogue.clear()
+    await catalogue.get(db)
+    assert db.queries == 2
@@ -0,0 +1,233 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from pydantic_ai import Agent, ModelRetry, RunContext
+from pydantic_ai.models.test import TestModel
+from pydantic_ai.tools import Tool, ToolDefinition
+from pydantic_ai.usage import Usage
+
+from pydantic_ai_examples.tools import cached_prepare, limits, memoize
+
+
+def greet(name: str) -> str:
+    return f"Hello {name}"
+
+
+def test_cached_prepare_needs_a_fingerprint():
+    with pytest.raises(TypeError):
+        cached_prepare()  # type: ignore[call-arg]
+
+
+def test_cached_prepare_per_fingerprint_and_copy_on_write():
+    calls: list[str] = []
+
+    @cached_prepare(fingerprint=lambda deps: deps)
+    async def describe_name(
+        ctx: RunContext[str], tool_def: ToolDefinition
+    ) -> ToolDefinition | None:
+        calls.append(ctx.deps)
+        if ctx.deps == "nobody":
+            return None
+        # changed in place, which must not leak into the tool's own schema
+        tool_def.parameters_json_schema["properties"]["name"]["description"] = (
+            f"Name of the {ctx.deps} to greet"
+        )
+        return tool_def
+
+    tool = Tool(greet, prepare=describe_name)
+    model = TestModel()
+    agent = Agent(model, tools=[tool], deps_type=str)
+
+    def description() -> str | None:
+        tools = model.last_model_request_parameters.function_tools
+        if not tools:
+            return None
+        return tools[0].parameters_json_schema["properties"]["name"]["description"]
+
+    agent.run_sync("hi", deps="human")
+    assert description() == "Name of the human to greet"
+    agent.run_sync("hi", deps="machine")
+    assert description() == "Name of the machine to greet"
+    agent.run_sync("hi", deps="human")
+    assert description() == "Name of the human to greet"
+    agent.run_sync("hi", deps="nobody")
+    assert description() is None
+    agent.run_sync("hi", deps="nobody")
+
+    # called once per fingerprint, however many steps and runs
+    assert calls == ["human", "machine", "nobody"]
+    assert describe_name.stats.misses == 3
+    assert describe_name.stats.hits > 0
+    assert "description" not in tool._base_parameters_json_schema["properties"]["name"]
+
+
+def test_cached_prepare_evicts_least_recently_used():
+    calls: list[int] = []
+
+    @cached_prepare(fingerprint=lambda deps: deps, maxsize=2)
+    async def prepare(ctx: RunContext[int], tool_def: ToolDefinition) -> ToolDefinition:
+        calls.append(ctx.deps)
+        return tool_def
+
+    agent = Agent(TestModel(call_tools=[]), tools=[Tool(greet, prepare=prepare)])
+    for deps in (1, 2, 1, 3, 2):
+        agent.run_sync("hi", deps=deps)
+
+    assert calls == [1, 2, 3, 2]
+    assert prepare.stats.evictions == 2
+
+
+@pytest.mark.anyio
+async def test_limits_caps_concurrent_calls():
+    running = peak = 0
+
+    @limits(max_concurrency=2)
+    async def lookup(i: int) -> int:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return i
+
+    assert await asyncio.gather(*(lookup(i) for i in range(6))) == list(range(6))
+    assert peak == 2
+
+
+def test_limits_on_several_event_loops():
+    @limits(max_concurrency=1)
+    async def lookup(i: int) -> int:
+        await asyncio.sleep(0.01)
+        return i
+
+    async def contended() -> list[int]:
+        return await asyncio.gather(*(lookup(i) for i in range(3)))
+
+    # the second loop would get a semaphore bound to the first
+    assert asyncio.run(contended()) == [0, 1, 2]
+    assert asyncio.run(contended()) == [0, 1, 2]
+
+
+@pytest.mark.anyio
+async def test_limits_timeout_asks_the_model_to_retry():
+    @limits(timeout=0.01)
+    async def slow_lookup() -> str:
+        await asyncio.sleep(1)
+        return "too late"
+
+    with pytest.raises(ModelRetry, match="slow_lookup timed out after 0.01s"):
+        await slow_lookup()
+
+
+@pytest.mark.anyio
+async def test_limits_runs_sync_tools_in_a_thread():
+    @limits(max_concurrency=4)
+    def blocking_lookup(i: int) -> str:
+        time.sleep(0.05)
+        return threading.current_thread().name
+
+    start = time.perf_counter()
+    names = await asyncio.gather(*(blocking_lookup(i) for i in range(4)))
+    assert time.perf_counter() - start < 0.15
+    assert threading.current_thread().name not in names
+    assert blocking_lookup.__name__ == "blocking_lookup"
+
+
+def run_context(deps: object) -> RunContext[object]:
+    return RunContext(deps=deps, model=TestModel(), usage=Usage(), prompt=None)
+
+
+@pytest.mark.anyio
+async def test_memoize_expires_after_ttl():
+    calls: list[int] = []
+
+    @memoize(ttl=0.05)
+    async def lookup(order: int) -> int:
+        calls.append(order)
+        return order * 2
+
+    assert [await lookup(1), await lookup(1), await lookup(2)] == [2, 2, 4]
+    assert calls == [1, 2]
+    await asyncio.sleep(0.06)
+    assert await lookup(1) == 2
+    assert calls == [1, 2, 1]
+    assert (lookup.cache.stats.hits, lookup.cache.stats.misses) == (1, 3)
+
+
+@pytest.mark.anyio
+async def test_memoize_keys_on_projected_deps():
+    calls: list[tuple[str, int]] = []
+
+    @memoize(deps_key=lambda deps: deps["customer_id"])
+    async def balance(ctx: RunContext[dict[str, object]], account: int) -> str:
+        calls.append((ctx.deps["customer_id"], account))
+        return f"{ctx.deps['customer_id']}:{account}"
+
+    alice = run_context({"customer_id": "alice", "session": 1})
+    assert await balance(alice, 1) == "alice:1"
+    # only the projection is part of the key
+    assert await balance(run_context({"customer_id": "alice", "session": 2}), 1) == (
+        "alice:1"
+    )
+    assert await balance(run_context({"customer_id": "bob"}), 1) == "bob:1"
+    assert calls == [("alice", 1), ("bob", 1)]
+
+
+@pytest.mark.anyio
+async def test_memoize_coalesces_concurrent_calls():
+    calls = 0
+
+    @memoize()
+    async def lookup(order: int) -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return f"order {order}"
+
+    results = await asyncio.gather(*(lookup(1) for _ in range(5)))
+    assert results == ["order 1"] * 5
+    assert calls == 1
+    assert lookup.cache.stats.coalesced == 4
+
+
+@pytest.mark.anyio
+async def test_memoize_leader_cancelled_waiters_get_the_result():
+    started = asyncio.Event()
+
+    @memoize()
+    async def lookup(order: int) -> str:
+        started.set()
+        await asyncio.sleep(0.02)
+        return f"order {order}"
+
+    leader = asyncio.create_task(lookup(1))
+    await started.wait()
+    waiter = asyncio.create_task(lookup(1))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await waiter == "order 1"
+    assert leader.cancelled()
+    # the call ran to completion for the waiter, and its result is cached
+    assert await lookup(1) == "order 1"
+    assert lookup.cache.stats.misses == 1
+
+
+@pytest.mark.anyio
+async def test_memoize_does_not_cache_exceptions():
+    calls = 0
+
+    @memoize()
+    def lookup(order: int) -> str:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ModelRetry("database busy")
+        return f"order {order}"
+
+    with pytest.raises(ModelRetry, match="database busy"):
+        await lookup(1)
+    assert await lookup(1) == "order 1"
+    assert calls == 2
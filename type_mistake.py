@@ -1,10 +1,9 @@
 # Type safe by design
 from dataclasses import dataclass
 
-import nest_asyncio
 from pydantic_ai import Agent, RunContext
 
-nest_asyncio.apply()
+from pydantic_ai_examples.loop_thread import run_sync
 
 
 @dataclass
@@ -28,6 +27,6 @@ def foobar(x: bytes) -> None:
     pass
 
 
-result = agent.run_sync("Does their name start with 'A'?", deps=User("Anne"))
+result = run_sync(agent, "Does their name start with 'A'?", deps=User("Anne"))
 foobar(result.output)
 print(result.output)